@@ -0,0 +1,212 @@
+"""Time the classification hot paths on synthetic imagery and flag regressions.
+
+    python benchmark.py --save-baseline               # record this machine's baseline
+    python benchmark.py                               # compare against it, exit 1 on regressions
+    python benchmark.py --quick --filter resize       # a few small cases of one stage
+
+Images are generated from a fixed seed and the model is a tiny stand-in with the
+real 64x64x3 -> 10 class signature, so the suite runs offline on a CPU. Image size
+sets classifier.input_size, so every stage runs at that resolution. Cases with
+more than --max-tiles grid cells are skipped, since their resized tiles alone
+would not fit in memory.
+"""
+import argparse
+import json
+import logging
+import platform
+import re
+import statistics
+import tempfile
+import time
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable, Dict, List
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from classifier import SatelliteImageClassifier
+
+logger = logging.getLogger(__name__)
+
+IMAGE_SIZES = (256, 1024, 2048, 4096, 8192)
+GRID_SIZES = (8, 16, 32, 64)
+QUICK_IMAGE_SIZES = (256, 1024)
+QUICK_GRID_SIZES = (16, 32)
+
+def synthetic_image(size: int, seed: int = 0) -> np.ndarray:
+    """A (size, size, 3) uint8 image of smooth colour regions with sensor-like noise."""
+    rng = np.random.default_rng(seed)
+    regions = rng.integers(0, 256, (max(2, size // 128), max(2, size // 128), 3), dtype=np.uint8)
+    image = cv2.resize(regions, (size, size), interpolation=cv2.INTER_LINEAR)
+    noise = rng.integers(-12, 13, image.shape, dtype=np.int16)
+    return np.clip(image.astype(np.int16) + noise, 0, 255).astype(np.uint8)
+
+def build_stand_in_model(path: Path) -> Path:
+    """Save a small, fixed-seed Keras model with the classifier's input and output shapes."""
+    from tensorflow import keras  # type: ignore
+
+    keras.utils.set_random_seed(0)
+    model = keras.Sequential([
+        keras.Input((64, 64, 3)),
+        keras.layers.Conv2D(8, 3, strides=2, activation="relu"),
+        keras.layers.Conv2D(16, 3, strides=2, activation="relu"),
+        keras.layers.GlobalAveragePooling2D(),
+        keras.layers.Dense(10, activation="softmax"),
+    ])
+    model.save(path)
+    return path
+
+def measure(fn: Callable[[], object], min_time: float, max_repeats: int) -> Dict[str, float]:
+    """Run fn once to warm up, then repeatedly until min_time has passed (at least 3 runs)."""
+    fn()
+    samples: List[float] = []
+    deadline = time.perf_counter() + min_time
+    while len(samples) < 3 or (time.perf_counter() < deadline and len(samples) < max_repeats):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return {"median": statistics.median(samples), "min": min(samples), "repeats": len(samples)}
+
+def cases(classifier: SatelliteImageClassifier, image_dir: Path, sizes, grids,
+          max_tiles: int) -> Dict[str, Callable[[], object]]:
+    """Benchmark callables keyed by 'stage[size=..,grid=..]'.
+
+    Each size's image and PNG are made the first time a case of that size runs,
+    so cases left out by --filter cost nothing. A case's warm-up run pays for it.
+    """
+    found: Dict[str, Callable[[], object]] = {}
+
+    @lru_cache(maxsize=1)  # cases are grouped by size, so keep only the current image
+    def synthetic(size: int) -> np.ndarray:
+        return synthetic_image(size, seed=size)
+
+    @lru_cache(maxsize=None)
+    def synthetic_png(size: int) -> Path:
+        path = image_dir / f"synthetic_{size}.png"
+        Image.fromarray(synthetic(size)).save(path, compress_level=1)
+        return path
+
+    for size in sizes:
+        for grid in grids:
+            rows, cols = classifier.grid_shape(size, size, grid)
+            if rows * cols > max_tiles:
+                logger.info(f"Skipping size={size} grid={grid}: {rows * cols} tiles > --max-tiles {max_tiles}")
+                continue
+            labels = np.random.default_rng(grid).integers(0, len(classifier.class_names), rows * cols,
+                                                           dtype=np.uint8)
+            name = f"size={size},grid={grid}"
+
+            def configure(size=size, grid=grid):
+                classifier.input_size = (size, size)
+                classifier.grid_size = grid
+
+            def divide(size=size, grid=grid):
+                configure()
+                return classifier.divide_image_into_grids(synthetic(size), grid)
+
+            def resize(size=size, grid=grid):
+                configure()
+                return classifier.resize_tiles(classifier.tile_image(synthetic(size), grid))
+
+            def colorize(size=size, labels=labels, grid=grid):
+                configure()
+                return classifier.colorize_grids(synthetic(size), labels, grid)
+
+            def counts(labels=labels):
+                counts = np.bincount(labels, minlength=len(classifier.class_names))
+                return {name: int(n) for name, n in zip(classifier.class_names, counts)}
+
+            def process(size=size):
+                configure()
+                return classifier.process_image(str(synthetic_png(size)))
+
+            found[f"divide[{name}]"] = divide
+            found[f"resize[{name}]"] = resize
+            found[f"colorize[{name}]"] = colorize
+            found[f"counts[{name}]"] = counts
+            found[f"process_image[{name}]"] = process
+    return found
+
+def environment() -> Dict[str, str]:
+    return {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "processor": platform.processor() or platform.machine(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+    }
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]],
+            threshold: float) -> List[str]:
+    """Names of cases whose median is more than `threshold` slower than the baseline."""
+    regressions = []
+    for name, result in results.items():
+        reference = baseline.get(name)
+        if reference and result["median"] > reference["median"] * (1 + threshold):
+            regressions.append(name)
+    return regressions
+
+def main(argv=None) -> int:
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", help=f"Image sizes in pixels (default {IMAGE_SIZES})")
+    parser.add_argument("--grids", type=int, nargs="+", help=f"Grid sizes in pixels (default {GRID_SIZES})")
+    parser.add_argument("--quick", action="store_true", help="Only the small sizes, for a fast check")
+    parser.add_argument("--filter", help="Regex; only run cases whose name matches")
+    parser.add_argument("--max-tiles", type=int, default=65536, help="Skip cases with more grid cells")
+    parser.add_argument("--min-time", type=float, default=0.5, help="Seconds to spend per case")
+    parser.add_argument("--max-repeats", type=int, default=50, help="Upper bound on runs per case")
+    parser.add_argument("--baseline", default="benchmark_baseline.json", help="Baseline file")
+    parser.add_argument("--save-baseline", action="store_true", help="Write the results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.15, help="Allowed slowdown vs the baseline")
+    parser.add_argument("--output", help="Also write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    sizes = args.sizes or (QUICK_IMAGE_SIZES if args.quick else IMAGE_SIZES)
+    grids = args.grids or (QUICK_GRID_SIZES if args.quick else GRID_SIZES)
+    pattern = re.compile(args.filter) if args.filter else None
+
+    Image.MAX_IMAGE_PIXELS = None  # the synthetic images are trusted
+    classifier = SatelliteImageClassifier(authentication_enabled=False)
+    classifier.tile_cache = None  # time the work, not cache hits
+    results: Dict[str, Dict[str, float]] = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        classifier.load_model(str(build_stand_in_model(Path(tmp) / "stand_in.keras")), backend="keras")
+        for name, fn in cases(classifier, Path(tmp), sizes, grids, args.max_tiles).items():
+            if pattern and not pattern.search(name):
+                continue
+            results[name] = measure(fn, args.min_time, args.max_repeats)
+            logger.info(f"{name:<40} median {results[name]['median'] * 1000:10.3f} ms  "
+                        f"min {results[name]['min'] * 1000:10.3f} ms  ({results[name]['repeats']} runs)")
+        classifier.release_model()
+
+    report = {"environment": environment(), "results": results}
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+
+    baseline_path = Path(args.baseline)
+    if args.save_baseline:
+        saved = json.loads(baseline_path.read_text()) if baseline_path.exists() else {"results": {}}
+        saved["environment"] = report["environment"]
+        saved["results"].update(results)
+        baseline_path.write_text(json.dumps(saved, indent=2))
+        logger.info(f"Saved {len(results)} results to {baseline_path}")
+        return 0
+    if not baseline_path.exists():
+        logger.info(f"No baseline at {baseline_path}; run with --save-baseline to record one")
+        return 0
+
+    baseline = json.loads(baseline_path.read_text())
+    if baseline.get("environment") != report["environment"]:
+        logger.warning("Baseline was recorded in a different environment; timings may not be comparable")
+    regressions = compare(results, baseline.get("results", {}), args.threshold)
+    for name in regressions:
+        logger.error(f"REGRESSION {name}: {results[name]['median'] * 1000:.3f} ms vs baseline "
+                     f"{baseline['results'][name]['median'] * 1000:.3f} ms")
+    logger.info(f"{len(regressions)} regressions over {args.threshold:.0%} in {len(results)} cases")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
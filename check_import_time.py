@@ -0,0 +1,57 @@
+"""Fail when importing the app gets slow or pulls in a heavy module at startup.
+
+    python check_import_time.py                       # classifierApp within 1500 ms
+    python check_import_time.py classifier --budget-ms 500
+
+Runs the import in a fresh interpreter under `python -X importtime` and reads the
+cumulative time of the top-level module from its report.
+"""
+import argparse
+import re
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict
+
+# Modules that must only be imported on first use, never at startup
+DEFERRED = ("tensorflow", "keras", "matplotlib", "requests")
+
+LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+def import_times(module: str) -> Dict[str, int]:
+    """Cumulative import time in microseconds for every module imported by `module`."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=Path(__file__).resolve().parent, capture_output=True, text=True,
+    )
+    if proc.returncode:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr.strip().splitlines()[-1]}")
+    times = {}
+    for match in LINE.finditer(proc.stderr):
+        times[match.group(4)] = int(match.group(2))
+    return times
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("module", nargs="?", default="classifierApp")
+    parser.add_argument("--budget-ms", type=float, default=1500.0)
+    parser.add_argument("--runs", type=int, default=3, help="Best of this many cold imports")
+    args = parser.parse_args(argv)
+
+    runs = [import_times(args.module) for _ in range(args.runs)]
+    elapsed_ms = min(times[args.module] for times in runs) / 1000
+    eager = sorted({name for name in runs[0] if name.split(".")[0] in DEFERRED})
+
+    print(f"import {args.module}: {elapsed_ms:.0f} ms (budget {args.budget_ms:.0f} ms)")
+    failed = False
+    if eager:
+        print(f"FAIL: imported at startup: {', '.join(eager[:10])}")
+        failed = True
+    if elapsed_ms > args.budget_ms:
+        slowest = sorted(runs[0].items(), key=lambda kv: kv[1], reverse=True)[1:6]
+        print("FAIL: over budget; slowest imports: " + ", ".join(f"{n} {t / 1000:.0f} ms" for n, t in slowest))
+        failed = True
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
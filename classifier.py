@@ -1,17 +1,31 @@
 # classifier.py (Fixed to handle model input size requirements with grid numbers)
 import numpy as np
 import cv2
+import argparse
+import glob
+import sys
 import logging
 from pathlib import Path
 import hashlib
 import json
 import time
-from typing import Tuple, Dict, Any, List
+from typing import Tuple, Dict, Any, List, Iterable, Iterator, Callable
 import sqlite3
 import re
+import os
+import threading
+import tracemalloc
+import queue
+import multiprocessing
+from multiprocessing import shared_memory
+from collections import OrderedDict, deque
+from concurrent.futures import Future, InvalidStateError, ThreadPoolExecutor
+from itertools import count, islice
+from dataclasses import dataclass, field
+from contextlib import contextmanager
+from functools import lru_cache, wraps
 
-from tensorflow.keras.models import load_model # type: ignore
-from tensorflow.keras.preprocessing.image import img_to_array, load_img # type: ignore
+from PIL import Image
 
 # ---------------------------
 # Logging Configuration
@@ -37,64 +51,444 @@ class ModelLoadError(Exception):
 class ImageProcessingError(Exception):
     pass
 
+class JobCancelled(Exception):
+    pass
+
+# ---------------------------
+# Metrics
+# ---------------------------
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _label_text(pairs: Iterable[Tuple[str, str]]) -> str:
+    pairs = list(pairs)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape_label(value)}"' for name, value in pairs) + "}"
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+class _Metric:
+    """A metric family: one child per distinct label set, created on first use.
+
+    A metric without labels has its single child from the start, so it is
+    exported as zero before anything updates it.
+    """
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self.labels()
+
+    def labels(self, **labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {tuple(labels)}")
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            child = self._children.get(key)
+            if child is None:
+                child = self._children[key] = self._new_child()
+        return child
+
+    def _unlabelled(self):
+        if self.labelnames:
+            raise ValueError(f"{self.name} needs labels {self.labelnames}")
+        return self.labels()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _samples(self, labels: List[Tuple[str, str]], child) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            children = sorted(self._children.items())
+        for key, child in children:
+            lines.extend(self._samples(list(zip(self.labelnames, key)), child))
+        return lines
+
+class _CounterValue:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        if amount < 0:
+            raise ValueError("Counters can only go up")
+        with self._lock:
+            self.value += amount
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0):
+        self._unlabelled().inc(amount)
+
+    def _new_child(self):
+        return _CounterValue()
+
+    def _samples(self, labels, child):
+        return [f"{self.name}{_label_text(labels)} {_format_value(child.value)}"]
+
+class _GaugeValue:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._value = 0.0
+        self._function: Callable[[], float] | None = None
+
+    def set(self, value: float):
+        with self._lock:
+            self._value = float(value)
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount: float = 1.0):
+        self.inc(-amount)
+
+    def set_function(self, function: Callable[[], float]):
+        """Read the value from function() at every scrape instead of storing it."""
+        self._function = function
+
+    @property
+    def value(self) -> float:
+        if self._function is not None:
+            try:
+                return float(self._function())
+            except Exception as e:
+                logger.warning(f"Gauge callback failed: {str(e)}")
+                return float("nan")
+        return self._value
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float):
+        self._unlabelled().set(value)
+
+    def inc(self, amount: float = 1.0):
+        self._unlabelled().inc(amount)
+
+    def dec(self, amount: float = 1.0):
+        self._unlabelled().dec(amount)
+
+    def set_function(self, function: Callable[[], float]):
+        self._unlabelled().set_function(function)
+
+    def _new_child(self):
+        return _GaugeValue()
+
+    def _samples(self, labels, child):
+        value = child.value
+        return [f"{self.name}{_label_text(labels)} {'NaN' if value != value else _format_value(value)}"]
+
+class _HistogramValue:
+    def __init__(self, buckets: Tuple[float, ...]):
+        self._lock = threading.Lock()
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        index = int(np.searchsorted(self.buckets, value, side="left"))
+        with self._lock:
+            if index < len(self.counts):
+                self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Iterable[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))  # before super(), which may create the first child
+        super().__init__(name, documentation, labelnames)
+
+    def observe(self, value: float):
+        self._unlabelled().observe(value)
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def _samples(self, labels, child):
+        with child._lock:
+            counts, total, count = list(child.counts), child.sum, child.count
+        lines = []
+        cumulative = 0
+        for bound, n in zip(self.buckets, counts):
+            cumulative += n
+            lines.append(f"{self.name}_bucket{_label_text(labels + [('le', _format_value(bound))])} {cumulative}")
+        lines.append(f"{self.name}_bucket{_label_text(labels + [('le', '+Inf')])} {count}")
+        lines.append(f"{self.name}_sum{_label_text(labels)} {_format_value(total)}")
+        lines.append(f"{self.name}_count{_label_text(labels)} {count}")
+        return lines
+
+class MetricsRegistry:
+    """In-process counters, gauges and histograms in the Prometheus text format.
+
+    Metrics are cheap to update and are only rendered when scraped, so they are
+    always collected; exporting is opt-in through serve() (a local HTTP
+    endpoint) or write_textfile() (for node_exporter's textfile collector).
+    Asking for an existing name returns the metric already registered.
+    """
+
+    def __init__(self):
+        self._metrics: "OrderedDict[str, _Metric]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name: str, documentation: str, labelnames, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, documentation, labelnames, **kwargs)
+            elif type(metric) is not cls or metric.labelnames != tuple(labelnames):
+                raise ValueError(f"Metric {name} is already registered as a different {metric.kind}")
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._register(Counter, name, documentation, tuple(labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self._register(Gauge, name, documentation, tuple(labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                  buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram, name, documentation, tuple(labelnames), buckets=buckets)
+
+    def render(self) -> str:
+        with self._lock:
+            families = list(self._metrics.values())
+        return "\n".join(line for metric in families for line in metric.render()) + "\n"
+
+    def write_textfile(self, path: str):
+        """Write the metrics atomically, so a collector never reads a half-written file."""
+        path = Path(path)
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        tmp.write_text(self.render(), encoding="utf-8")
+        os.replace(tmp, path)
+
+    def write_textfile_every(self, path: str, interval: float = 15.0) -> threading.Event:
+        """Rewrite the textfile every `interval` seconds until the returned event is set."""
+        stop = threading.Event()
+
+        def loop():
+            while not stop.wait(interval):
+                try:
+                    self.write_textfile(path)
+                except OSError as e:
+                    logger.warning(f"Could not write metrics to {path}: {str(e)}")
+
+        threading.Thread(target=loop, name="metrics-textfile", daemon=True).start()
+        return stop
+
+    def serve(self, port: int = 9464, addr: str = "127.0.0.1"):
+        """Serve /metrics on a daemon thread; returns the server, call shutdown() to stop it."""
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = registry.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # scrapes every few seconds would flood the log
+
+        server = ThreadingHTTPServer((addr, port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+        logger.info(f"Serving metrics on http://{addr}:{server.server_address[1]}/metrics")
+        return server
+
+metrics = MetricsRegistry()
+
+_DB_SECONDS = metrics.histogram("satellite_db_query_seconds", "User database call latency.", ["operation"])
+_DB_ERRORS = metrics.counter("satellite_db_errors_total", "User database calls that raised an sqlite3 error.",
+                             ["operation"])
+_AUTH_ATTEMPTS = metrics.counter("satellite_auth_attempts_total", "Login attempts by outcome.", ["outcome"])
+_AUTH_SECONDS = metrics.histogram("satellite_auth_seconds", "Time to check a login.")
+_ACTIVE_SESSIONS = metrics.gauge("satellite_active_sessions", "Sessions currently held in memory.")
+_CLASSIFICATIONS = metrics.counter("satellite_classifications_total", "Classification calls by method.",
+                                   ["call", "cached"])
+_CLASSIFICATION_ERRORS = metrics.counter("satellite_classification_errors_total",
+                                         "Classification calls that raised.", ["call", "error"])
+_TILES_CLASSIFIED = metrics.counter("satellite_tiles_classified_total", "Grid cells classified.", ["call"])
+_STAGE_SECONDS = metrics.histogram("satellite_stage_seconds", "Time per classification stage.", ["stage"])
+_TILE_CACHE_LOOKUPS = metrics.counter("satellite_tile_cache_lookups_total",
+                                      "Tile prediction cache lookups.", ["result"])
+_RESULT_CACHE_LOOKUPS = metrics.counter("satellite_result_cache_lookups_total",
+                                        "Whole-image result cache lookups.", ["result"])
+_INFERENCE_BATCH_TILES = metrics.histogram("satellite_inference_batch_tiles", "Tiles per inference backend call.",
+                                           buckets=(1, 8, 32, 64, 128, 256, 512, 1024))
+_DECODE_QUEUE_DEPTH = metrics.gauge("satellite_decode_queue_depth",
+                                    "Decoded images waiting for inference in classify_batch.")
+
+def _db_timed(method):
+    """Time a DatabaseManager call and count the sqlite3 errors escaping it under the method's name.
+
+    Errors a method turns into its own exceptions, such as add_user's duplicate
+    usernames, are outcomes rather than database failures and are not counted.
+    """
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return method(self, *args, **kwargs)
+        except sqlite3.Error:
+            _DB_ERRORS.labels(operation=method.__name__).inc()
+            raise
+        finally:
+            _DB_SECONDS.labels(operation=method.__name__).observe(time.perf_counter() - start)
+    return wrapper
+
+def _record_profile_metrics(profile: "CallProfile"):
+    """Profile hook feeding the metrics registry; every classifier registers it."""
+    _CLASSIFICATIONS.labels(call=profile.call, cached=str(profile.cached).lower()).inc()
+    _TILES_CLASSIFIED.labels(call=profile.call).inc(profile.tiles)
+    for size in profile.batch_sizes:
+        _INFERENCE_BATCH_TILES.observe(size)
+    for stage, seconds in profile.timings.items():
+        _STAGE_SECONDS.labels(stage=stage).observe(seconds)
+
 # ---------------------------
 # Database Manager
 # ---------------------------
 class DatabaseManager:
-    def __init__(self, db_file: str = "users.db"):
+    """SQLite user store holding one persistent connection per thread.
+
+    Connections run in WAL mode, so logins reading the users table are not
+    blocked by a concurrent write, with synchronous=NORMAL (a commit is a WAL
+    append rather than a full fsync) and a larger page cache. Each query is
+    fixed SQL text, so sqlite3's per-connection statement cache reuses the
+    compiled statement instead of re-preparing it on every call. Writes go
+    through transaction(). Connections of threads that have exited are closed
+    the next time a thread opens one; close() closes them all.
+    """
+
+    CACHE_SIZE_KIB = 8192
+    STATEMENT_CACHE = 64
+
+    def __init__(self, db_file: str = "users.db", timeout: float = 5.0):
         self.db_file = Path(db_file)
+        self.timeout = timeout
+        self._local = threading.local()
+        self._connections: Dict[int, Tuple[threading.Thread, sqlite3.Connection]] = {}
+        self._lock = threading.Lock()
+        self._generation = 0  # bumped by close() so threads drop their stale connection
         self._init_db()
 
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.generation == self._generation:
+            return conn
+        # isolation_level=None leaves transaction control to transaction()
+        conn = sqlite3.connect(self.db_file, timeout=self.timeout, isolation_level=None,
+                               check_same_thread=False, cached_statements=self.STATEMENT_CACHE)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute(f'PRAGMA cache_size=-{self.CACHE_SIZE_KIB}')
+        conn.execute('PRAGMA temp_store=MEMORY')
+        with self._lock:
+            for ident, (thread, stale) in list(self._connections.items()):
+                if not thread.is_alive():
+                    stale.close()
+                    del self._connections[ident]
+            self._connections[threading.get_ident()] = (threading.current_thread(), conn)
+            self._local.generation = self._generation
+        self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def transaction(self, immediate: bool = True) -> Iterator[sqlite3.Connection]:
+        """Run the block in one transaction on this thread's connection.
+
+        Commits when the block finishes and rolls back if it raises. immediate
+        takes the write lock up front, so two writers wait on busy_timeout
+        instead of failing on lock upgrade. A nested block joins the outer
+        transaction.
+        """
+        conn = self._connection()
+        if conn.in_transaction:
+            yield conn
+            return
+        conn.execute('BEGIN IMMEDIATE' if immediate else 'BEGIN')
+        try:
+            yield conn
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
     def _init_db(self):
-        conn = sqlite3.connect(self.db_file)
-        cursor = conn.cursor()
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                username TEXT UNIQUE NOT NULL,
-                password_hash TEXT NOT NULL,
-                email TEXT UNIQUE,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                last_login TIMESTAMP
-            )
-        ''')
-        conn.commit()
-        conn.close()
+        with self.transaction() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS users (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    username TEXT UNIQUE NOT NULL,
+                    password_hash TEXT NOT NULL,
+                    email TEXT UNIQUE,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    last_login TIMESTAMP
+                )
+            ''')
 
+    @_db_timed
     def add_user(self, username: str, password_hash: str, email: str = None):
-        conn = sqlite3.connect(self.db_file)
-        cursor = conn.cursor()
         try:
-            cursor.execute(
-                'INSERT INTO users (username, password_hash, email) VALUES (?, ?, ?)',
-                (username, password_hash, email)
-            )
-            conn.commit()
+            with self.transaction() as conn:
+                conn.execute(
+                    'INSERT INTO users (username, password_hash, email) VALUES (?, ?, ?)',
+                    (username, password_hash, email)
+                )
         except sqlite3.IntegrityError:
             raise RegistrationError("Username or email already exists")
-        finally:
-            conn.close()
 
+    @_db_timed
     def get_user(self, username: str):
-        conn = sqlite3.connect(self.db_file)
-        cursor = conn.cursor()
-        cursor.execute(
+        return self._connection().execute(
             'SELECT username, password_hash FROM users WHERE username = ?',
             (username,)
-        )
-        user = cursor.fetchone()
-        conn.close()
-        return user
+        ).fetchone()
 
+    @_db_timed
     def update_last_login(self, username: str):
-        conn = sqlite3.connect(self.db_file)
-        cursor = conn.cursor()
-        cursor.execute(
-            'UPDATE users SET last_login = CURRENT_TIMESTAMP WHERE username = ?',
-            (username,)
-        )
-        conn.commit()
-        conn.close()
+        with self.transaction() as conn:
+            conn.execute(
+                'UPDATE users SET last_login = CURRENT_TIMESTAMP WHERE username = ?',
+                (username,)
+            )
+
+    def close(self):
+        """Close every thread's connection; threads reconnect on their next call."""
+        with self._lock:
+            connections = [conn for _, conn in self._connections.values()]
+            self._connections.clear()
+            self._generation += 1
+        for conn in connections:
+            conn.close()
 
 # ---------------------------
 # Authentication Manager
@@ -137,52 +531,1042 @@ class AuthenticationManager:
         if email and not re.match(r'^[^@]+@[^@]+\.[^@]+$', email):
             raise RegistrationError("Invalid email format")
 
-        password_hash = self._hash_password(password)
-        self.db_manager.add_user(username, password_hash, email)
-        logger.info(f"User '{username}' registered successfully")
-        return True
+        password_hash = self._hash_password(password)
+        self.db_manager.add_user(username, password_hash, email)
+        logger.info(f"User '{username}' registered successfully")
+        return True
+
+    def authenticate(self, username: str, password: str) -> str:
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            if self.failed_attempts.get(username, 0) >= self.max_login_attempts:
+                outcome = "locked"
+                raise AuthenticationError("Account temporarily locked due to too many failed attempts")
+
+            user = self.db_manager.get_user(username)
+            if user and user[1] == self._hash_password(password):
+                self.failed_attempts[username] = 0
+                self.db_manager.update_last_login(username)
+                token = hashlib.sha256(f"{username}{time.time()}".encode()).hexdigest()
+                self.sessions[token] = {
+                    "username": username,
+                    "created_at": time.time()
+                }
+                _ACTIVE_SESSIONS.set(len(self.sessions))
+                outcome = "success"
+                logger.info(f"User '{username}' authenticated successfully")
+                return token
+            else:
+                self.failed_attempts[username] = self.failed_attempts.get(username, 0) + 1
+                remaining = self.max_login_attempts - self.failed_attempts[username]
+                outcome = "invalid_credentials"
+                raise AuthenticationError(f"Invalid credentials. {remaining} attempts left.")
+        finally:
+            _AUTH_ATTEMPTS.labels(outcome=outcome).inc()
+            _AUTH_SECONDS.observe(time.perf_counter() - start)
+
+    def validate_session(self, token: str) -> bool:
+        session = self.sessions.get(token)
+        if not session:
+            return False
+        if time.time() - session["created_at"] > self.session_timeout:
+            del self.sessions[token]
+            _ACTIVE_SESSIONS.set(len(self.sessions))
+            return False
+        return True
+
+    def logout(self, token: str):
+        if token in self.sessions:
+            user = self.sessions[token]["username"]
+            del self.sessions[token]
+            _ACTIVE_SESSIONS.set(len(self.sessions))
+            logger.info(f"User '{user}' logged out")
+
+# ---------------------------
+# Tile Resizing Helpers
+# ---------------------------
+@lru_cache(maxsize=64)
+def _clamped_edge_indices(src: int, dst: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Output indices where cv2's INTER_LINEAR clamps to the first/last source pixel.
+
+    Resizing a whole strip of tiles in one call matches per-tile resizing everywhere
+    except these positions, where a single tile would replicate its own edge pixel
+    instead of blending with the neighbouring tile.
+    """
+    x = (np.arange(dst) + 0.5) * (src / dst) - 0.5
+    x0 = np.floor(x)
+    return np.flatnonzero(x0 < 0), np.flatnonzero(x0 >= src - 1)
+
+@lru_cache(maxsize=32)
+def _grid_overlay(h: int, w: int, grid_size: int, rows: int, cols: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Flat pixel indices of the grid lines and the cell index labels.
+
+    The overlay only depends on the image shape and the grid, so it is drawn once
+    with the same cell-by-cell rectangle/putText sequence the colour map uses and
+    then stamped onto every rendered label map.
+    """
+    stencil = np.zeros((h, w), dtype=np.uint8)
+    idx = 0
+    for y in range(0, rows * grid_size, grid_size):
+        for x in range(0, cols * grid_size, grid_size):
+            actual_h = min(grid_size, h - y)
+            actual_w = min(grid_size, w - x)
+            stencil[y:y+actual_h, x:x+actual_w] = 0
+            cv2.rectangle(stencil, (x, y), (x+actual_w, y+actual_h), 1, 1)
+
+            # Only show number if grid is large enough. The text is drawn on a
+            # scratch cell because newer OpenCV builds antialias putText output.
+            if grid_size >= 20:
+                text = np.zeros((actual_h, actual_w), dtype=np.uint8)
+                cv2.putText(text, str(idx), (2, 10), cv2.FONT_HERSHEY_SIMPLEX, 0.3, 255, 1)
+                stencil[y:y+actual_h, x:x+actual_w][text > 127] = 2
+            idx += 1
+    stencil = stencil.ravel()
+    return np.flatnonzero(stencil == 1), np.flatnonzero(stencil == 2)
+
+# ---------------------------
+# Classification Results
+# ---------------------------
+@dataclass
+class ClassificationResult:
+    """Everything one classification run produced, kept at grid-cell resolution."""
+    image: np.ndarray
+    colored_image: np.ndarray
+    labels: np.ndarray          # (rows, cols) uint8 class index per cell
+    probabilities: np.ndarray   # (rows, cols, n_classes) float16 softmax output
+    counts: np.ndarray          # (n_classes,) cells per class
+    timings: Dict[str, float] = field(default_factory=dict)  # seconds per stage
+    path: str | None = None
+
+    def named_counts(self, class_names: List[str]) -> Dict[str, int]:
+        return {name: int(count) for name, count in zip(class_names, self.counts)}
+
+@dataclass
+class ClassificationProgress:
+    """One step of classify_stream.
+
+    result is the same object on every step and is filled in place: labels of
+    cells not classified yet are UNCLASSIFIED, and colored_image shows the source
+    image there. Pixel rows region[0]:region[1] changed in this step. On the
+    final step, levels holds the result of every cell size in the pass.
+    """
+    result: ClassificationResult
+    rows_done: int
+    rows_total: int
+    region: Tuple[int, int]
+    levels: Dict[int, ClassificationResult] | None = None
+
+    @property
+    def done(self) -> bool:
+        return self.rows_done == self.rows_total
+
+UNCLASSIFIED = 255  # label of cells classify_stream has not reached yet
+
+@dataclass
+class _PendingImage:
+    """An image in classify_batch whose tiles are spread over one or more batches."""
+    path: str
+    image: np.ndarray
+    rows: int
+    cols: int
+    tiles: np.ndarray
+    timings: Dict[str, float]
+    probabilities: np.ndarray | None = None
+    remaining: int = 0
+    batch_sizes: List[int] = field(default_factory=list)  # backend calls that carried its tiles
+
+@dataclass
+class BatchPipelineStats:
+    """Live counters for classify_batch's decode -> inference pipeline.
+
+    Busy times are summed over threads, so decode_busy can exceed wall time when
+    several decode workers run at once. decode_wait is time the inference stage
+    sat idle waiting for the next decoded image; the smaller it is next to
+    decode_busy, the more decode cost the prefetching hid.
+    """
+    decode_workers: int = 0
+    images: int = 0
+    failed: int = 0
+    tiles: int = 0
+    batches: int = 0
+    decode_busy: float = 0.0
+    inference_busy: float = 0.0
+    decode_wait: float = 0.0
+    wall: float = 0.0
+    queue_depth: int = 0       # decoded images ready when the inference stage last took one
+    queue_depth_max: int = 0
+    peak_memory: int | None = None  # tracemalloc peak over the whole run, when trace_memory is on
+    _depth_total: int = 0
+    _depth_samples: int = 0
+
+    def sample_queue_depth(self, depth: int):
+        self.queue_depth = depth
+        self.queue_depth_max = max(self.queue_depth_max, depth)
+        self._depth_total += depth
+        self._depth_samples += 1
+
+    @property
+    def queue_depth_mean(self) -> float:
+        return self._depth_total / self._depth_samples if self._depth_samples else 0.0
+
+    @property
+    def decode_hidden(self) -> float:
+        """Fraction of decode time that overlapped with other work instead of stalling inference."""
+        return 1.0 - min(self.decode_wait / self.decode_busy, 1.0) if self.decode_busy else 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        wall = self.wall or 1e-9
+        return {
+            "images": self.images,
+            "failed": self.failed,
+            "tiles": self.tiles,
+            "batches": self.batches,
+            "decode_workers": self.decode_workers,
+            "wall": round(self.wall, 6),
+            "decode_busy": round(self.decode_busy, 6),
+            "inference_busy": round(self.inference_busy, 6),
+            "decode_wait": round(self.decode_wait, 6),
+            "decode_utilization": round(self.decode_busy / (wall * max(self.decode_workers, 1)), 4),
+            "inference_utilization": round(self.inference_busy / wall, 4),
+            "decode_hidden": round(self.decode_hidden, 4),
+            "queue_depth_mean": round(self.queue_depth_mean, 3),
+            "queue_depth_max": self.queue_depth_max,
+            "peak_memory": self.peak_memory,
+        }
+
+# ---------------------------
+# Instrumentation
+# ---------------------------
+@dataclass
+class CallProfile:
+    """Where one classification call spent its time, handed to every profile hook."""
+    call: str                       # classifier method, or "worker_pool" for pool results
+    path: str | None
+    timings: Dict[str, float]       # perf_counter seconds per stage, plus "total"
+    tiles: int                      # grid cells classified, over all levels
+    batch_sizes: List[int]          # tiles in each backend call; empty when nothing reached the model.
+                                    # classify_batch lists a packed call under every image it carried
+    peak_memory: int | None = None  # bytes above the starting level, when trace_memory is on
+    cached: bool = False            # served from the result cache without inference
+
+class StageMetrics:
+    """Rolling per-stage latency samples summarised as p50/p95/p99.
+
+    Each metric keeps its last `window` samples, so the percentiles follow
+    recent calls rather than the whole session. Instances are callable and can
+    be registered directly as a profile hook.
+    """
+    PERCENTILES = (50, 95, 99)
+
+    def __init__(self, window: int = 1000):
+        self.window = window
+        self._samples: Dict[str, deque] = {}
+        self._calls: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, profile: CallProfile):
+        with self._lock:
+            self._calls[profile.call] = self._calls.get(profile.call, 0) + 1
+            for stage, seconds in profile.timings.items():
+                self._add(stage, seconds)
+            self._add("tiles", profile.tiles)
+            for size in profile.batch_sizes:
+                self._add("batch_size", size)
+            if profile.peak_memory is not None:
+                self._add("peak_memory", profile.peak_memory)
+
+    def _add(self, name: str, value: float):
+        samples = self._samples.get(name)
+        if samples is None:
+            samples = self._samples[name] = deque(maxlen=self.window)
+        samples.append(value)
+
+    def summary(self) -> Dict[str, Any]:
+        """{"calls": {...}, "metrics": {name: {count, mean, p50, p95, p99}}}; stages are in seconds."""
+        with self._lock:
+            samples = {name: np.asarray(values, dtype=np.float64) for name, values in self._samples.items()}
+            calls = dict(self._calls)
+        metrics = {}
+        for name, values in samples.items():
+            p = np.percentile(values, self.PERCENTILES)
+            metrics[name] = {"count": len(values), "mean": float(values.mean()),
+                             **{f"p{q}": float(v) for q, v in zip(self.PERCENTILES, p)}}
+        return {"calls": calls, "metrics": metrics}
+
+    def status_text(self, stages: Iterable[str] = ("total", "predict")) -> str:
+        """One line for a status bar, e.g. 'total p50 120 ms p95 310 ms p99 402 ms | ...'."""
+        summary = self.summary()
+        metrics = summary["metrics"]
+        parts = []
+        for stage in stages:
+            m = metrics.get(stage)
+            if m:
+                parts.append(f"{stage} " + " ".join(f"p{q} {m[f'p{q}'] * 1000:.0f} ms" for q in self.PERCENTILES))
+        if "peak_memory" in metrics:
+            parts.append(f"peak p95 {metrics['peak_memory']['p95'] / 1e6:.0f} MB")
+        count = sum(summary["calls"].values())
+        return " | ".join(parts) + f" (n={count})" if parts else ""
+
+    def dump(self, path: str):
+        Path(path).write_text(json.dumps(self.summary(), indent=2))
+
+    def clear(self):
+        with self._lock:
+            self._samples.clear()
+            self._calls.clear()
+
+class _PeakMemory:
+    """Peak bytes traced inside a with-block, above the level at entry, when enabled.
+
+    tracemalloc is process wide: it runs while any traced call is active, and
+    concurrent calls see each other's allocations. Allocations made outside
+    Python and numpy (e.g. by the TensorFlow runtime) are not traced.
+    """
+    _lock = threading.Lock()
+    _users = 0
+    _owned = False
+
+    def __init__(self, enabled: bool):
+        self.enabled = enabled
+        self.peak: int | None = None
+        self._base = 0
+
+    def __enter__(self):
+        if self.enabled:
+            with _PeakMemory._lock:
+                if not tracemalloc.is_tracing():
+                    tracemalloc.start()
+                    _PeakMemory._owned = True
+                _PeakMemory._users += 1
+            self._base = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        return self
+
+    def stop(self) -> int | None:
+        """End the measurement early; later calls and the block exit keep the first reading."""
+        if self.enabled:
+            self.enabled = False
+            self.peak = max(0, tracemalloc.get_traced_memory()[1] - self._base)
+            with _PeakMemory._lock:
+                _PeakMemory._users -= 1
+                if _PeakMemory._users == 0 and _PeakMemory._owned:
+                    tracemalloc.stop()
+                    _PeakMemory._owned = False
+        return self.peak
+
+    def __exit__(self, *exc):
+        self.stop()
+
+_batch_recorders = threading.local()
+
+class _BatchRecorder:
+    """Collects the size of each backend call made on this thread inside a with-block.
+
+    Recorders nest and a call is counted by the innermost one only.
+    """
+
+    def __init__(self):
+        self.sizes: List[int] = []
+
+    def __enter__(self):
+        if not hasattr(_batch_recorders, "stack"):
+            _batch_recorders.stack = []
+        _batch_recorders.stack.append(self)
+        return self
+
+    def __exit__(self, *exc):
+        _batch_recorders.stack.pop()
+
+def _record_batch(size: int):
+    stack = getattr(_batch_recorders, "stack", None)
+    if stack:
+        stack[-1].sizes.append(size)
+
+def _profiled(method):
+    """Report each call of a classify method to the classifier's profile hooks."""
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            with _PeakMemory(self.trace_memory) as memory, _BatchRecorder() as batches:
+                outcome = method(self, *args, **kwargs)
+        except Exception as e:
+            _CLASSIFICATION_ERRORS.labels(call=method.__name__, error=type(e).__name__).inc()
+            raise
+        self._emit_profile(method.__name__, outcome, batches.sizes, time.perf_counter() - start, memory.peak)
+        return outcome
+    return wrapper
+
+# ---------------------------
+# Job Cancellation
+# ---------------------------
+_job_context = threading.local()
+
+def check_cancelled():
+    """Raise JobCancelled if the scheduler job running on this thread has been cancelled.
+
+    Long operations call this between batches, windows and stages; outside a
+    scheduler job it does nothing.
+    """
+    token = getattr(_job_context, "token", None)
+    if token is not None and token.is_set():
+        raise JobCancelled("Job cancelled")
+
+def wait_cancellable(future: Future, poll: float = 0.1):
+    """future.result(), giving up with JobCancelled if the current job is cancelled meanwhile."""
+    while True:
+        try:
+            return future.result(timeout=poll)
+        except TimeoutError:
+            try:
+                check_cancelled()
+            except JobCancelled:
+                future.cancel()
+                raise
+
+# ---------------------------
+# Inference Backends
+# ---------------------------
+def _cast_pixels(batch: np.ndarray, dtype) -> np.ndarray:
+    """Convert between uint8 pixels and float pixels in [0, 1] for a model input of `dtype`."""
+    dtype = np.dtype(dtype)
+    if batch.dtype == dtype:
+        return batch
+    if dtype == np.uint8:
+        return np.clip(np.round(batch * 255), 0, 255).astype(np.uint8)
+    if batch.dtype == np.uint8:
+        return (batch.astype(np.float32) / 255).astype(dtype, copy=False)
+    return batch.astype(dtype)
+
+class InferenceBackend:
+    """A loaded model that maps (N, H, W, C) tiles to (N, n_classes) probabilities.
+
+    Tiles are uint8 pixels, as the classifier produces them; float tiles in [0, 1]
+    are accepted too. Models that take uint8 get the pixels as they are, models
+    exported with a float input get them scaled on the way in.
+    """
+    name = "base"
+
+    def __init__(self, model_path: Path, batch_size: int = 256):
+        self.model_path = Path(model_path)
+        self.batch_size = batch_size
+        self.input_shape: Tuple[int, ...] = ()
+
+    def _run(self, batch: np.ndarray) -> np.ndarray:
+        raise NotImplementedError
+
+    def predict(self, batch: np.ndarray, batch_size: int | None = None) -> np.ndarray:
+        batch = np.asarray(batch)
+        n = batch_size or self.batch_size
+        if len(batch) <= n:
+            check_cancelled()
+            _record_batch(len(batch))
+            return self._run(batch)
+        outputs = []
+        for i in range(0, len(batch), n):
+            check_cancelled()
+            _record_batch(min(n, len(batch) - i))
+            outputs.append(self._run(batch[i:i + n]))
+        return np.concatenate(outputs)
+
+class KerasBackend(InferenceBackend):
+    name = "keras"
+
+    def __init__(self, model_path: Path, batch_size: int = 256):
+        super().__init__(model_path, batch_size)
+        from tensorflow.keras.models import load_model  # type: ignore
+        self.model = load_model(self.model_path)
+        # The /255 scaling runs inside the graph, so tiles stay uint8 up to the model
+        self.fused_model = with_rescaling(self.model)
+        self.input_shape = tuple(self.model.input_shape[1:])
+        self._infer = None
+        self._compile()
+
+    def _compile(self):
+        """Trace the fused model once with a fixed uint8 tile signature and warm it up.
+
+        Calling the traced function skips the data adapter and callback machinery
+        Keras predict sets up on every call. If tracing fails, _run falls back to
+        model.predict.
+        """
+        import tensorflow as tf  # type: ignore
+        model = self.fused_model
+        spec = tf.TensorSpec((None, *self.input_shape), tf.uint8)
+        try:
+            infer = tf.function(lambda batch: model(batch, training=False), input_signature=[spec])
+            infer(tf.zeros((1, *self.input_shape), tf.uint8))
+        except Exception as e:
+            logger.warning(f"Falling back to model.predict, tracing failed: {str(e)}")
+            return
+        self._infer = infer
+        logger.info("Inference function compiled and warmed up")
+
+    def _run(self, batch: np.ndarray) -> np.ndarray:
+        batch = _cast_pixels(batch, np.uint8)
+        if self._infer is None:
+            return self.fused_model.predict(batch, batch_size=self.batch_size, verbose=0)
+        return self._infer(batch).numpy()
+
+class TFLiteBackend(InferenceBackend):
+    """TensorFlow Lite interpreter; float models run on the XNNPACK CPU delegate."""
+    name = "tflite"
+
+    def __init__(self, model_path: Path, batch_size: int = 256):
+        super().__init__(model_path, batch_size)
+        try:
+            from ai_edge_litert.interpreter import Interpreter  # type: ignore
+        except ImportError:
+            try:
+                from tflite_runtime.interpreter import Interpreter  # type: ignore
+            except ImportError:
+                import tensorflow as tf  # type: ignore
+                Interpreter = tf.lite.Interpreter
+        self.interpreter = Interpreter(model_path=str(self.model_path), num_threads=os.cpu_count() or 1)
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+        self.input_shape = tuple(int(d) for d in self._input["shape"][1:])
+        self._batch_shape = None
+        # Interpreters keep per-call tensor state and are not thread safe
+        self._lock = threading.Lock()
+
+    def _run(self, batch: np.ndarray) -> np.ndarray:
+        with self._lock:
+            if batch.shape != self._batch_shape:
+                self.interpreter.resize_tensor_input(self._input["index"], batch.shape)
+                self.interpreter.allocate_tensors()
+                self._batch_shape = batch.shape
+            self.interpreter.set_tensor(self._input["index"], self._quantize(batch))
+            self.interpreter.invoke()
+            return self._dequantize(self.interpreter.get_tensor(self._output["index"]))
+
+    def _quantize(self, batch: np.ndarray) -> np.ndarray:
+        scale, zero_point = self._input.get("quantization", (0.0, 0))
+        if self._input["dtype"] == np.float32 or not scale:
+            return _cast_pixels(batch, self._input["dtype"])
+        batch = _cast_pixels(batch, np.float32)
+        info = np.iinfo(self._input["dtype"])
+        return np.clip(np.round(batch / scale + zero_point), info.min, info.max).astype(self._input["dtype"])
+
+    def _dequantize(self, output: np.ndarray) -> np.ndarray:
+        scale, zero_point = self._output.get("quantization", (0.0, 0))
+        if output.dtype == np.float32 or not scale:
+            return output.astype(np.float32, copy=False)
+        return (output.astype(np.float32) - zero_point) * scale
+
+class OnnxBackend(InferenceBackend):
+    name = "onnx"
+
+    def __init__(self, model_path: Path, batch_size: int = 256):
+        super().__init__(model_path, batch_size)
+        try:
+            import onnxruntime as ort  # type: ignore
+        except ImportError:
+            raise ModelLoadError("onnxruntime is required for .onnx models")
+        self.session = ort.InferenceSession(str(self.model_path), providers=["CPUExecutionProvider"])
+        model_input = self.session.get_inputs()[0]
+        self._input_name = model_input.name
+        self._input_dtype = np.uint8 if model_input.type == "tensor(uint8)" else np.float32
+        self.input_shape = tuple(model_input.shape[1:])
+
+    def _run(self, batch: np.ndarray) -> np.ndarray:
+        return self.session.run(None, {self._input_name: _cast_pixels(batch, self._input_dtype)})[0]
+
+BACKENDS: Dict[str, type] = {
+    "keras": KerasBackend,
+    "tflite": TFLiteBackend,
+    "onnx": OnnxBackend,
+}
+
+MODEL_SUFFIXES: Dict[str, str] = {
+    ".h5": "keras",
+    ".keras": "keras",
+    ".tflite": "tflite",
+    ".onnx": "onnx",
+}
+
+def resolve_model(model_path: str, backend: str | None = None) -> Tuple[Path, str]:
+    """Check a model file and pick its backend, by name or by the file suffix."""
+    path = Path(model_path)
+    if not path.exists() or path.suffix.lower() not in MODEL_SUFFIXES:
+        raise ModelLoadError("Invalid model file")
+    backend_name = backend or MODEL_SUFFIXES[path.suffix.lower()]
+    if backend_name not in BACKENDS:
+        raise ModelLoadError(f"Unknown inference backend '{backend_name}'")
+    return path, backend_name
+
+def export_tflite(model, output_path: str, calibration_tiles: np.ndarray | None = None) -> Path:
+    """Convert a Keras model to a TFLite flatbuffer.
+
+    With calibration_tiles the model is fully INT8 quantized: weights and
+    activations are int8, with activation ranges taken from running the tiles
+    through the model. Input and output keep the Keras model's dtypes so the
+    model is a drop-in replacement for the float export.
+    """
+    import tensorflow as tf  # type: ignore
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    if calibration_tiles is not None:
+        input_dtype = np.dtype(model.inputs[0].dtype)
+
+        def representative_dataset():
+            for tile in calibration_tiles:
+                yield [_cast_pixels(tile[np.newaxis], input_dtype)]
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = representative_dataset
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    output_path = Path(output_path)
+    output_path.write_bytes(converter.convert())
+    return output_path
+
+def export_onnx(model, output_path: str) -> Path:
+    """Convert a Keras model to ONNX with a dynamic batch dimension (needs tf2onnx)."""
+    import tensorflow as tf  # type: ignore
+    try:
+        import tf2onnx  # type: ignore
+    except ImportError:
+        raise ModelLoadError("tf2onnx is required to export ONNX models")
+    spec = (tf.TensorSpec((None, *model.input_shape[1:]), tf.as_dtype(model.inputs[0].dtype), name="input"),)
+    output_path = Path(output_path)
+    tf2onnx.convert.from_keras(model, input_signature=spec, output_path=str(output_path))
+    return output_path
+
+def backend_parity(reference: InferenceBackend, candidate: InferenceBackend, tiles: np.ndarray) -> float:
+    """Fraction of tiles on which two backends predict the same class."""
+    expected = np.argmax(reference.predict(tiles), axis=1)
+    actual = np.argmax(candidate.predict(tiles), axis=1)
+    return float((expected == actual).mean()) if len(tiles) else 1.0
+
+def warm_up():
+    """Import TensorFlow ahead of the first model load, e.g. from a background thread."""
+    start = time.perf_counter()
+    import tensorflow  # type: ignore  # noqa: F401
+    from tensorflow import keras  # type: ignore  # noqa: F401
+    logger.info(f"TensorFlow imported in {time.perf_counter() - start:.2f}s")
+
+# ---------------------------
+# Model Registry
+# ---------------------------
+class ModelHandle:
+    """A counted reference to a backend shared through a ModelRegistry."""
+
+    def __init__(self, registry: "ModelRegistry", key: Tuple[str, float, str], backend: InferenceBackend):
+        self.registry = registry
+        self.key = key
+        self.backend = backend
+        self.released = False
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            self.registry.release(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+class ModelRegistry:
+    """Process-wide cache of loaded backends keyed by file content hash, mtime and backend.
+
+    acquire() hands out counted handles to one shared backend per key, so picking
+    the same weights again, or from another window, costs a hash of the file
+    instead of a reload and graph build. All backends are safe to call from
+    several threads. An entry whose last handle is released is evicted after
+    grace_period seconds unless it is acquired again first, so switching models
+    frees the old one while quickly re-picking a file still reuses it. None keeps
+    entries until evict() or evict_unused() drops them.
+    """
+
+    def __init__(self, grace_period: float | None = 30.0):
+        self.grace_period = grace_period
+        self._lock = threading.Lock()
+        self._entries: Dict[Tuple[str, float, str], Dict[str, Any]] = {}
+        self._loading: Dict[Tuple[str, float, str], threading.Lock] = {}
+
+    @staticmethod
+    def _key(model_path: Path, backend_name: str) -> Tuple[str, float, str]:
+        digest = hashlib.sha256()
+        with open(model_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        return digest.hexdigest(), model_path.stat().st_mtime, backend_name
+
+    def acquire(self, model_path: Path, backend_name: str, batch_size: int = 256) -> ModelHandle:
+        key = self._key(Path(model_path), backend_name)
+        with self._lock:
+            loading = self._loading.setdefault(key, threading.Lock())
+        # Only callers asking for the same key wait on each other's load
+        with loading:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    entry["refs"] += 1
+                    logger.info(f"Reusing loaded model {Path(model_path).name} ({entry['refs']} handles)")
+                    return ModelHandle(self, key, entry["backend"])
+            backend = BACKENDS[backend_name](Path(model_path), batch_size=batch_size)
+            with self._lock:
+                self._entries[key] = {"backend": backend, "refs": 1}
+            return ModelHandle(self, key, backend)
+
+    def release(self, handle: ModelHandle):
+        with self._lock:
+            entry = self._entries.get(handle.key)
+            if entry is None or entry["backend"] is not handle.backend:
+                return
+            entry["refs"] = max(0, entry["refs"] - 1)
+            if entry["refs"] or self.grace_period is None:
+                return
+            if self.grace_period <= 0:
+                del self._entries[handle.key]
+                logger.info("Evicted model after its last release")
+                return
+        timer = threading.Timer(self.grace_period, self._evict_if_unused, args=(handle.key, entry))
+        timer.daemon = True
+        timer.start()
+
+    def _evict_if_unused(self, key: Tuple[str, float, str], entry: Dict[str, Any]):
+        with self._lock:
+            if self._entries.get(key) is entry and not entry["refs"]:
+                del self._entries[key]
+                logger.info(f"Evicted model unused for {self.grace_period:g}s")
+
+    def contains(self, model_path: Path, backend_name: str) -> bool:
+        key = self._key(Path(model_path), backend_name)
+        with self._lock:
+            return key in self._entries
+
+    def evict(self, model_path: Path, backend_name: str, force: bool = False) -> bool:
+        """Drop a loaded model. Without force, models that still have handles are kept."""
+        key = self._key(Path(model_path), backend_name)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or (entry["refs"] and not force):
+                return False
+            del self._entries[key]
+        logger.info(f"Evicted model {Path(model_path).name}")
+        return True
+
+    def evict_unused(self) -> int:
+        with self._lock:
+            unused = [key for key, entry in self._entries.items() if not entry["refs"]]
+            for key in unused:
+                del self._entries[key]
+        return len(unused)
+
+    def stats(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [{"hash": key[0], "mtime": key[1], "backend": key[2], "refs": entry["refs"]}
+                    for key, entry in self._entries.items()]
+
+model_registry = ModelRegistry()
+
+# ---------------------------
+# Tile Prediction Cache
+# ---------------------------
+class TilePredictionCache:
+    """LRU cache of class probabilities keyed by model fingerprint and tile content.
+
+    Tiles are hashed after resizing, so two cells with the same pixels share one
+    entry however they were produced. The cache is bounded by entry count and by
+    the bytes held in keys and probability vectors; the least recently used
+    entries are dropped first.
+    """
+
+    def __init__(self, max_entries: int = 200_000, max_bytes: int = 64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def tile_keys(fingerprint: str, batch: np.ndarray) -> List[bytes]:
+        batch = np.ascontiguousarray(batch)
+        salt = hashlib.blake2b(f"{fingerprint}:{batch.dtype.str}:{batch.shape[1:]}".encode()).digest()
+        return [hashlib.blake2b(tile, digest_size=16, key=salt).digest() for tile in batch]
+
+    def get_many(self, keys: List[bytes]) -> List[np.ndarray | None]:
+        with self._lock:
+            found = []
+            for key in keys:
+                probs = self._entries.get(key)
+                if probs is not None:
+                    self._entries.move_to_end(key)
+                found.append(probs)
+            hits = sum(p is not None for p in found)
+            self.hits += hits
+            self.misses += len(keys) - hits
+        _TILE_CACHE_LOOKUPS.labels(result="hit").inc(hits)
+        _TILE_CACHE_LOOKUPS.labels(result="miss").inc(len(keys) - hits)
+        return found
+
+    def put_many(self, keys: List[bytes], probabilities: np.ndarray):
+        with self._lock:
+            for key, probs in zip(keys, probabilities):
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    continue
+                probs = np.array(probs, copy=True)
+                self._entries[key] = probs
+                self.bytes += len(key) + probs.nbytes
+            while self._entries and (len(self._entries) > self.max_entries or self.bytes > self.max_bytes):
+                key, probs = self._entries.popitem(last=False)
+                self.bytes -= len(key) + probs.nbytes
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+# ---------------------------
+# Result Cache
+# ---------------------------
+def file_digest(path: str, chunk_size: int = 1 << 20) -> str:
+    """SHA-256 of a file, read in chunks so large rasters are never held in memory."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def user_cache_dir(name: str = "satellite-classifier") -> Path:
+    """Per-user cache directory: %LOCALAPPDATA% on Windows, ~/Library/Caches on macOS, else XDG."""
+    if sys.platform == "win32":
+        base = Path(os.environ.get("LOCALAPPDATA") or Path.home() / "AppData" / "Local")
+    elif sys.platform == "darwin":
+        base = Path.home() / "Library" / "Caches"
+    else:
+        base = Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache")
+    return base / name
+
+class ResultCache:
+    """Persistent store of whole-image labels and probabilities.
+
+    Each result is a compressed .npz blob in cache_dir, indexed by a SQLite table
+    that records its size and last use. When the blobs exceed max_bytes the least
+    recently used ones are deleted.
+    """
+
+    def __init__(self, cache_dir: str | None = None, max_bytes: int = 512 * 1024 * 1024):
+        self.cache_dir = Path(cache_dir) if cache_dir else user_cache_dir() / "results"
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.db_file = self.cache_dir / "index.db"
+        self.max_bytes = max_bytes
+        self._init_db()
+
+    def _init_db(self):
+        conn = sqlite3.connect(self.db_file)
+        cursor = conn.cursor()
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS results (
+                key TEXT PRIMARY KEY,
+                source TEXT,
+                blob TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+        ''')
+        conn.commit()
+        conn.close()
+
+    @staticmethod
+    def make_key(**parts) -> str:
+        return hashlib.sha256(json.dumps(parts, sort_keys=True).encode()).hexdigest()
+
+    def get(self, key: str) -> Tuple[np.ndarray, np.ndarray] | None:
+        conn = sqlite3.connect(self.db_file)
+        cursor = conn.cursor()
+        cursor.execute('SELECT blob FROM results WHERE key = ?', (key,))
+        row = cursor.fetchone()
+        if row is None:
+            conn.close()
+            _RESULT_CACHE_LOOKUPS.labels(result="miss").inc()
+            return None
+        try:
+            with np.load(self.cache_dir / row[0]) as data:
+                labels, probabilities = data["labels"], data["probabilities"]
+        except (OSError, KeyError, ValueError) as e:
+            logger.warning(f"Dropping unreadable cached result {row[0]}: {str(e)}")
+            cursor.execute('DELETE FROM results WHERE key = ?', (key,))
+            conn.commit()
+            conn.close()
+            _RESULT_CACHE_LOOKUPS.labels(result="miss").inc()
+            return None
+        cursor.execute('UPDATE results SET last_used = ? WHERE key = ?', (time.time(), key))
+        conn.commit()
+        conn.close()
+        _RESULT_CACHE_LOOKUPS.labels(result="hit").inc()
+        return labels, probabilities
+
+    def put(self, key: str, labels: np.ndarray, probabilities: np.ndarray, source: str | None = None):
+        blob = f"{key}.npz"
+        tmp = self.cache_dir / f"{key}.{threading.get_ident()}.tmp.npz"
+        np.savez_compressed(tmp, labels=labels, probabilities=probabilities)
+        os.replace(tmp, self.cache_dir / blob)
+        now = time.time()
+        conn = sqlite3.connect(self.db_file)
+        cursor = conn.cursor()
+        cursor.execute(
+            'INSERT OR REPLACE INTO results (key, source, blob, size, created_at, last_used) VALUES (?, ?, ?, ?, ?, ?)',
+            (key, source, blob, (self.cache_dir / blob).stat().st_size, now, now)
+        )
+        conn.commit()
+        conn.close()
+        self.evict()
+
+    def evict(self) -> int:
+        """Delete least recently used results until the store fits in max_bytes."""
+        conn = sqlite3.connect(self.db_file)
+        cursor = conn.cursor()
+        cursor.execute('SELECT key, blob, size FROM results ORDER BY last_used DESC')
+        total, stale = 0, []
+        for key, blob, size in cursor.fetchall():
+            total += size
+            if total > self.max_bytes:
+                stale.append((key, blob))
+        for key, blob in stale:
+            (self.cache_dir / blob).unlink(missing_ok=True)
+            cursor.execute('DELETE FROM results WHERE key = ?', (key,))
+        conn.commit()
+        conn.close()
+        return len(stale)
+
+    def clear(self):
+        max_bytes, self.max_bytes = self.max_bytes, -1
+        try:
+            self.evict()
+        finally:
+            self.max_bytes = max_bytes
+
+    def stats(self) -> Dict[str, Any]:
+        conn = sqlite3.connect(self.db_file)
+        cursor = conn.cursor()
+        cursor.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results')
+        entries, size = cursor.fetchone()
+        conn.close()
+        return {"entries": entries, "bytes": size, "max_bytes": self.max_bytes}
+
+# ---------------------------
+# Model Conversion
+# ---------------------------
+def with_rescaling(model):
+    """Wrap a model that expects pixels in [0, 1] so it takes uint8 pixels instead."""
+    from tensorflow import keras  # type: ignore
+    inputs = keras.Input(model.input_shape[1:], dtype="uint8")
+    outputs = model(keras.layers.Rescaling(1.0 / 255)(inputs))
+    return keras.Model(inputs, outputs)
 
-    def authenticate(self, username: str, password: str) -> str:
-        if self.failed_attempts.get(username, 0) >= self.max_login_attempts:
-            raise AuthenticationError("Account temporarily locked due to too many failed attempts")
-
-        user = self.db_manager.get_user(username)
-        if user and user[1] == self._hash_password(password):
-            self.failed_attempts[username] = 0
-            self.db_manager.update_last_login(username)
-            token = hashlib.sha256(f"{username}{time.time()}".encode()).hexdigest()
-            self.sessions[token] = {
-                "username": username,
-                "created_at": time.time()
-            }
-            logger.info(f"User '{username}' authenticated successfully")
-            return token
+# ---------------------------
+# Raster Window Reader
+# ---------------------------
+class RasterWindowReader:
+    """Reads RGB pixel windows from a large image without decoding all of it.
+
+    Uses rasterio (tiled/striped GeoTIFF decoding) when installed, then a tifffile
+    memory map for uncompressed TIFFs, and finally Pillow, which decodes formats
+    without random access (JPEG, PNG) once on first read.
+    """
+    def __init__(self, image_path: str):
+        self.path = Path(image_path)
+        self._dataset = None
+        self._array = None
+        self._image = None
+
+        try:
+            import rasterio  # type: ignore
+        except ImportError:
+            rasterio = None
+        if rasterio is not None:
+            try:
+                self._dataset = rasterio.open(self.path)
+                self.height, self.width = self._dataset.height, self._dataset.width
+                return
+            except Exception as e:
+                logger.debug(f"rasterio could not open {self.path}: {str(e)}")
+
+        if self.path.suffix.lower() in (".tif", ".tiff"):
+            try:
+                import tifffile  # type: ignore
+                self._array = tifffile.memmap(self.path, mode="r")
+                self.height, self.width = self._array.shape[:2]
+                return
+            except Exception as e:
+                logger.debug(f"No memory map for {self.path}: {str(e)}")
+
+        try:
+            self._image = Image.open(self.path)
+        except OSError as e:
+            raise ImageProcessingError(f"Cannot read image: {str(e)}")
+        self.width, self.height = self._image.size
+
+    def read(self, y: int, x: int, h: int, w: int) -> np.ndarray:
+        """Return the window as an (h, w, 3) uint8 array."""
+        if self._dataset is not None:
+            from rasterio.windows import Window  # type: ignore
+            bands = list(range(1, min(self._dataset.count, 3) + 1))
+            window = np.moveaxis(self._dataset.read(bands, window=Window(x, y, w, h)), 0, -1)
+        elif self._array is not None:
+            window = np.asarray(self._array[y:y+h, x:x+w])
         else:
-            self.failed_attempts[username] = self.failed_attempts.get(username, 0) + 1
-            remaining = self.max_login_attempts - self.failed_attempts[username]
-            raise AuthenticationError(f"Invalid credentials. {remaining} attempts left.")
+            window = np.asarray(self._image.crop((x, y, x + w, y + h)).convert("RGB"))
 
-    def validate_session(self, token: str) -> bool:
-        session = self.sessions.get(token)
-        if not session:
-            return False
-        if time.time() - session["created_at"] > self.session_timeout:
-            del self.sessions[token]
-            return False
-        return True
+        if window.ndim == 2:
+            window = window[..., np.newaxis]
+        if window.shape[2] == 1:
+            window = np.repeat(window, 3, axis=2)
+        window = window[..., :3]
+        if window.dtype != np.uint8:
+            scale = np.iinfo(window.dtype).max if np.issubdtype(window.dtype, np.integer) else 1.0
+            window = np.clip(window / scale * 255.0, 0, 255).astype(np.uint8)
+        return window
 
-    def logout(self, token: str):
-        if token in self.sessions:
-            user = self.sessions[token]["username"]
-            del self.sessions[token]
-            logger.info(f"User '{user}' logged out")
+    def close(self):
+        if self._dataset is not None:
+            self._dataset.close()
+        if self._image is not None:
+            self._image.close()
+        self._array = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
 
 # ---------------------------
 # Satellite Image Classifier
 # ---------------------------
 class SatelliteImageClassifier:
     def __init__(self, authentication_enabled: bool = True):
-        self.model = None
+        self.model = None  # Keras model, only set for the keras backend
+        self.backend: InferenceBackend | None = None
+        self._model_handle: ModelHandle | None = None
+        self.inference_batch_size = 256  # max tiles per backend call
+        self.model_fingerprint = ""  # content hash and backend of the loaded model
+        self.tile_cache: TilePredictionCache | None = TilePredictionCache()  # None disables caching
+        self.result_cache: ResultCache | None = None  # persistent whole-image results
+        self.trace_memory = False  # tracemalloc peak per call; slows allocation-heavy stages
+        self.stage_metrics = StageMetrics()
+        self.profile_hooks: List[Callable[[CallProfile], None]] = [self.stage_metrics, _record_profile_metrics]
+        self.last_profile: CallProfile | None = None
         self.model_path: Path | None = None
         self.auth_enabled = authentication_enabled
         self.auth_manager = AuthenticationManager() if authentication_enabled else None
@@ -190,13 +1574,19 @@ class SatelliteImageClassifier:
 
         # Grid size for visualization (smaller for more detailed classification)
         self.grid_size = 32
+
+        # How partial cells at the right/bottom edge are tiled: "pad" or "crop"
+        self.edge_mode = "pad"
         
         # Model input size (required by the model)
         self.model_input_size = (64, 64)
         
         # Overall image input size
         self.input_size = (256, 256)
-        self.supported_extensions = [".jpg", ".jpeg", ".png", ".tiff"]
+
+        # Per-thread scratch buffers reused by resize_tiles across calls
+        self._buffers = threading.local()
+        self.supported_extensions = [".jpg", ".jpeg", ".png", ".tiff", ".tif"]
 
         self.class_colors: Dict[int, List[int]] = {
             0: [144, 238, 144], 1: [34, 139, 34], 2: [173, 255, 47],
@@ -234,18 +1624,101 @@ class SatelliteImageClassifier:
             self.auth_manager.logout(self.session_token)
             self.session_token = None
 
+    # ---------------------------
+    # Instrumentation Hooks
+    # ---------------------------
+    def add_profile_hook(self, hook: Callable[[CallProfile], None]) -> Callable[[CallProfile], None]:
+        """Call hook(profile) after every classification; it runs on the classifying thread."""
+        self.profile_hooks.append(hook)
+        return hook
+
+    def remove_profile_hook(self, hook: Callable[[CallProfile], None]):
+        if hook in self.profile_hooks:
+            self.profile_hooks.remove(hook)
+
+    def _emit_profile(self, call: str, outcome, batch_sizes: List[int], total: float | None = None,
+                      peak_memory: int | None = None):
+        """Build a CallProfile from a result (or a dict of pyramid levels) and pass it to the hooks."""
+        results = list(outcome.values()) if isinstance(outcome, dict) else [outcome]
+        if not results:
+            return
+        timings = dict(results[0].timings)
+        if len(results) > 1:
+            # Levels share load/tile/resize/predict; each paints its own colour map
+            timings["colorize"] = sum(r.timings.get("colorize", 0.0) for r in results)
+        timings["total"] = total if total is not None else sum(timings.values())
+        tiles = sum(r.labels.size for r in results)
+        profile = CallProfile(
+            call=call,
+            path=results[0].path,
+            timings=timings,
+            tiles=tiles,
+            batch_sizes=list(batch_sizes),
+            peak_memory=peak_memory,
+            cached="predict" not in timings,
+        )
+        self.last_profile = profile
+        for hook in list(self.profile_hooks):
+            try:
+                hook(profile)
+            except Exception as e:
+                logger.warning(f"Profile hook {hook!r} failed: {str(e)}")
+
     # ---------------------------
     # Model Loading
     # ---------------------------
-    def load_model(self, model_path: str):
+    def load_model(self, model_path: str, backend: str | None = None):
+        """Load a model through the backend named by `backend` or by the file suffix.
+
+        .h5/.keras load with Keras, .tflite with the TFLite interpreter and .onnx
+        with ONNX Runtime, so a deployment picks its runtime by the model file it ships.
+        """
         if not self.validate_session():
             raise AuthenticationError("Session expired")
-        path = Path(model_path)
-        if not path.exists() or path.suffix not in [".h5", ".keras"]:
-            raise ModelLoadError("Invalid model file")
-        self.model = load_model(path)
+        path, backend_name = resolve_model(model_path, backend)
+        handle = model_registry.acquire(path, backend_name, batch_size=self.inference_batch_size)
+        self.release_model()
+        self._model_handle = handle
+        self.backend = handle.backend
+        self.model = getattr(self.backend, "model", None)
+        self.model_fingerprint = f"{backend_name}:{handle.key[0]}"
         self.model_path = path
-        logger.info(f"Model loaded from {path}")
+        logger.info(f"Model loaded from {path} ({backend_name} backend)")
+
+    def release_model(self):
+        """Give this classifier's model handle back to the registry."""
+        if self._model_handle is not None:
+            self._model_handle.release()
+        self._model_handle = None
+        self.backend = None
+        self.model = None
+
+    def predict_tiles(self, batch: np.ndarray) -> np.ndarray:
+        """Class probabilities for a (N, H, W, C) batch of model-ready tiles.
+
+        With a tile cache, only tiles missing from it go to the model, and identical
+        tiles within the batch are predicted once.
+        """
+        if self.tile_cache is None:
+            return self.backend.predict(batch, batch_size=self.inference_batch_size)
+
+        keys = TilePredictionCache.tile_keys(self.model_fingerprint, batch)
+        cached = self.tile_cache.get_many(keys)
+        missing: Dict[bytes, List[int]] = {}
+        for i, (key, probs) in enumerate(zip(keys, cached)):
+            if probs is None:
+                missing.setdefault(key, []).append(i)
+
+        if missing:
+            first = [indices[0] for indices in missing.values()]
+            predicted = self.backend.predict(batch[first], batch_size=self.inference_batch_size)
+            self.tile_cache.put_many(list(missing), predicted)
+            for indices, probs in zip(missing.values(), predicted):
+                for i in indices:
+                    cached[i] = probs
+        if not cached:
+            return self.backend.predict(batch, batch_size=self.inference_batch_size)
+        return np.stack(cached)
 
     # ---------------------------
     # Image Handling
@@ -257,77 +1730,1365 @@ class SatelliteImageClassifier:
         return True
 
     def load_image(self, image_path: str) -> np.ndarray:
+        """Decode to an (H, W, 3) uint8 array; the model applies the /255 scaling itself."""
         if not self.validate_session():
             raise AuthenticationError("Session expired")
         self._validate_image_path(image_path)
-        image = load_img(image_path, target_size=self.input_size)
-        image = img_to_array(image) / 255.0
+        # Same decode as keras load_img: RGB, nearest-neighbour resize to (height, width)
+        with Image.open(image_path) as img:
+            if img.mode != "RGB":
+                img = img.convert("RGB")
+            size = (self.input_size[1], self.input_size[0])
+            if img.size != size:
+                img = img.resize(size, Image.NEAREST)
+            image = np.array(img, dtype=np.uint8)
         return image
 
-    def divide_image_into_grids(self, image: np.ndarray, grid_size: int) -> np.ndarray:
-        h, w, _ = image.shape
-        grids = []
-        for y in range(0, h, grid_size):
-            for x in range(0, w, grid_size):
-                grid = image[y:y+grid_size, x:x+grid_size]
-                if grid.shape[0] != grid_size or grid.shape[1] != grid_size:
-                    grid = cv2.resize(grid, (grid_size, grid_size))
-                grids.append(grid)
-        return np.array(grids)
+    def tile_image(self, image: np.ndarray, grid_size: int, edge_mode: str | None = None) -> np.ndarray:
+        """Return a (rows, cols, grid_size, grid_size, C) strided view of the image.
+
+        edge_mode "pad" replicates the last row/column so partial edge cells become
+        full cells (one padded copy, only when the image is not a multiple of
+        grid_size). "crop" drops partial edge cells and never copies.
+        """
+        edge_mode = edge_mode or self.edge_mode
+        if edge_mode not in ("pad", "crop"):
+            raise ImageProcessingError(f"Unknown edge mode '{edge_mode}'")
+        if image.ndim == 2:
+            image = image[..., np.newaxis]
+
+        h, w, c = image.shape
+        if edge_mode == "pad":
+            pad_h, pad_w = -h % grid_size, -w % grid_size
+            if pad_h or pad_w:
+                image = np.pad(image, ((0, pad_h), (0, pad_w), (0, 0)), mode="edge")
+        rows, cols = image.shape[0] // grid_size, image.shape[1] // grid_size
+        if rows == 0 or cols == 0:
+            raise ImageProcessingError("Image is smaller than a single grid cell")
+
+        # Splitting each spatial axis in two is always expressible as strides,
+        # so this reshape/swap is a view on the (possibly padded) image.
+        image = image[:rows * grid_size, :cols * grid_size]
+        return image.reshape(rows, grid_size, cols, grid_size, c).swapaxes(1, 2)
+
+    def grid_shape(self, h: int, w: int, grid_size: int | None = None) -> Tuple[int, int]:
+        """Rows and columns of cells tile_image produces for an h x w image."""
+        g = grid_size or self.grid_size
+        if self.edge_mode == "crop":
+            return h // g, w // g
+        return -(-h // g), -(-w // g)
+
+    def divide_image_into_grids(self, image: np.ndarray, grid_size: int,
+                                edge_mode: str | None = None) -> np.ndarray:
+        tiles = self.tile_image(image, grid_size, edge_mode)
+        return tiles.reshape(-1, *tiles.shape[2:])
+
+    def _buffer(self, name: str, shape: Tuple[int, ...], dtype) -> np.ndarray:
+        buffers = self._buffers.__dict__
+        buf = buffers.get(name)
+        if buf is None or buf.shape != shape or buf.dtype != dtype:
+            buf = buffers[name] = np.empty(shape, dtype=dtype)
+        return buf
+
+    def resize_tiles(self, tiles: np.ndarray) -> np.ndarray:
+        """Resize a (rows, cols, g, g, C) tile view to a (N, H, W, C) model batch.
+
+        Each row of tiles is resized as one image strip and the edge-clamped columns
+        are replaced by resizing the tiles' first and last pixel columns on their
+        own, so the output is identical to resizing every tile on its own, for
+        uint8 as well as float tiles. The returned array is a per-thread buffer
+        that is overwritten by the next call.
+        """
+        rows, cols, g, _, c = tiles.shape
+        out_w, out_h = self.model_input_size
+        batch = self._buffer("batch", (rows * cols, out_h, out_w, c), tiles.dtype)
+        tall = self._buffer("tall", (out_h, cols * out_w, c), tiles.dtype)
+        edge = self._buffer("edge", (out_h, cols, c), tiles.dtype)
+        lo, hi = _clamped_edge_indices(g, out_w)
+
+        for r in range(rows):
+            strip = tiles[r].swapaxes(0, 1).reshape(g, cols * g, c)
+            # The strip is exactly one tile high, so vertical clamping already
+            # happens at the tile edges.
+            cv2.resize(strip, (cols * out_w, out_h), dst=tall, interpolation=cv2.INTER_LINEAR)
+            tall_cells = tall.reshape(out_h, cols, out_w, c)
+            strip_cells = strip.reshape(g, cols, g, c)
+            for idx, column in ((lo, 0), (hi, -1)):
+                if len(idx):
+                    # A one-pixel-wide column keeps its width, so only the vertical pass applies
+                    cv2.resize(np.ascontiguousarray(strip_cells[:, :, column]), (cols, out_h),
+                               dst=edge, interpolation=cv2.INTER_LINEAR)
+                    tall_cells[:, :, idx] = edge[:, :, np.newaxis]
+            np.copyto(batch[r * cols:(r + 1) * cols], tall_cells.swapaxes(0, 1))
+        return batch
 
     # ---------------------------
     # Colorization & Visualization
     # ---------------------------
-    def colorize_grids(self, original_image: np.ndarray, predictions: np.ndarray) -> np.ndarray:
-        h, w, _ = original_image.shape
-        colored_image = np.zeros_like(original_image)
-        idx = 0
-        for y in range(0, h, self.grid_size):
-            for x in range(0, w, self.grid_size):
-                if idx >= len(predictions):
-                    break
-                color = np.array(self.class_colors[predictions[idx]]) / 255.0
-                actual_h = min(self.grid_size, h - y)
-                actual_w = min(self.grid_size, w - x)
-                resized_color = cv2.resize(np.full((self.grid_size, self.grid_size, 3), color),
-                                           (actual_w, actual_h))
-                colored_image[y:y+actual_h, x:x+actual_w] = resized_color
-                cv2.rectangle(colored_image, (x, y), (x+actual_w, y+actual_h), (0,0,0), 1)
-                
-                # Add grid index number with smaller font for more grids
-                font_scale = 0.3  # Smaller font size for more grids
-                font_thickness = 1
-                text_pos = (x + 2, y + 10)  # Position in top-left corner
-                
-                # Only show number if grid is large enough
-                if self.grid_size >= 20:
-                    cv2.putText(colored_image, str(idx), text_pos,
-                                cv2.FONT_HERSHEY_SIMPLEX, font_scale, (1,1,1), font_thickness)
-                idx += 1
+    def colorize_grids(self, original_image: np.ndarray, predictions: np.ndarray,
+                       grid_size: int | None = None) -> np.ndarray:
+        """Render predictions as a uint8 RGB map with grid lines and cell indices."""
+        h, w = original_image.shape[:2]
+        g = grid_size or self.grid_size
+        rows, cols = self.grid_shape(h, w, g)
+        labels = np.asarray(predictions).reshape(rows, cols)
+        colored_image = np.zeros((h, w, 3), dtype=np.uint8)
+        self._paint_rows(colored_image, labels, 0, rows, g)
         return colored_image
 
+    def _paint_rows(self, canvas: np.ndarray, labels: np.ndarray, r0: int, r1: int,
+                    grid_size: int) -> Tuple[int, int]:
+        """Render cell rows r0:r1 of a label grid onto a uint8 canvas; returns the pixel rows touched.
+
+        Painting any split of the rows in order gives the same pixels as painting
+        them all at once, because each band only takes the overlay pixels inside it.
+        """
+        h, w = canvas.shape[:2]
+        g = grid_size
+        rows, cols = labels.shape
+        y0, y1 = r0 * g, min(r1 * g, h)
+
+        palette = np.array([self.class_colors[i] for i in range(len(self.class_colors))], dtype=np.uint8)
+        label_map = labels[r0:r1].repeat(g, axis=0).repeat(g, axis=1)[:y1 - y0, :w]
+        canvas[y0:y1, :label_map.shape[1]] = palette[label_map]
+
+        line_idx, text_idx = _grid_overlay(h, w, g, rows, cols)
+        flat = canvas.reshape(-1, 3)
+        lo, hi = y0 * w, y1 * w
+        flat[line_idx[np.searchsorted(line_idx, lo):np.searchsorted(line_idx, hi)]] = 0
+        flat[text_idx[np.searchsorted(text_idx, lo):np.searchsorted(text_idx, hi)]] = 255
+        return y0, y1
+
     # ---------------------------
     # Full Image Processing
     # ---------------------------
-    def process_image(self, image_path: str) -> Tuple[np.ndarray, np.ndarray]:
+    def _build_result(self, image: np.ndarray, rows: int, cols: int, probabilities: np.ndarray,
+                      timings: Dict[str, float], path: str | None = None,
+                      grid_size: int | None = None) -> ClassificationResult:
+        predictions = np.argmax(probabilities, axis=1).astype(np.uint8)
+
+        # Create colored visualization with original grid size
+        start = time.perf_counter()
+        colored_image = self.colorize_grids(image, predictions, grid_size)
+        timings["colorize"] = time.perf_counter() - start
+
+        return ClassificationResult(
+            image=image,
+            colored_image=colored_image,
+            labels=predictions.reshape(rows, cols),
+            probabilities=probabilities.astype(np.float16).reshape(rows, cols, -1),
+            counts=np.bincount(predictions, minlength=len(self.class_names)),
+            timings=timings,
+            path=path,
+        )
+
+    @_profiled
+    def classify_image(self, image_path: str) -> ClassificationResult:
         if not self.validate_session():
             raise AuthenticationError("Session expired")
-        if not self.model:
+        if not self.backend:
             raise ModelLoadError("Load a model first")
-        
+
+        timings: Dict[str, float] = {}
+        start = time.perf_counter()
+
         # Load the image
         image = self.load_image(image_path)
-        
-        # Divide into smaller grids for visualization
-        grids = self.divide_image_into_grids(image, self.grid_size)
-        
+        timings["load"] = time.perf_counter() - start
+
+        cache_key = None
+        if self.result_cache is not None:
+            start = time.perf_counter()
+            cache_key = self._result_key(image_path)
+            cached = self.result_cache.get(cache_key)
+            timings["cache"] = time.perf_counter() - start
+            if cached is not None:
+                return self._cached_result(image, *cached, timings, str(image_path))
+
+        # Divide into smaller grids for visualization (strided view, no copy)
+        start = time.perf_counter()
+        tiles = self.tile_image(image, self.grid_size)
+        rows, cols = tiles.shape[:2]
+        timings["tile"] = time.perf_counter() - start
+
         # Resize grids to match model input size
-        resized_grids = np.array([cv2.resize(grid, self.model_input_size) for grid in grids])
-        
+        start = time.perf_counter()
+        resized_grids = self.resize_tiles(tiles)
+        timings["resize"] = time.perf_counter() - start
+
         # Make predictions
-        predictions = np.argmax(self.model.predict(resized_grids, verbose=0), axis=1)
-        
-        # Create colored visualization with original grid size
-        colored_image = self.colorize_grids(image, predictions)
-        
-        return image, colored_image
\ No newline at end of file
+        start = time.perf_counter()
+        probabilities = self.predict_tiles(resized_grids)
+        timings["predict"] = time.perf_counter() - start
+
+        result = self._build_result(image, rows, cols, probabilities, timings, str(image_path))
+        if cache_key is not None:
+            self.result_cache.put(cache_key, result.labels, result.probabilities, str(image_path))
+        return result
+
+    def _result_key(self, image_path: str, grid_size: int | None = None) -> str:
+        return ResultCache.make_key(
+            file=file_digest(image_path),
+            model=self.model_fingerprint,
+            grid_size=grid_size or self.grid_size,
+            edge_mode=self.edge_mode,
+            pixels="uint8",
+            input_size=list(self.input_size),
+            model_input_size=list(self.model_input_size),
+        )
+
+    def _cached_result(self, image: np.ndarray, labels: np.ndarray, probabilities: np.ndarray,
+                       timings: Dict[str, float], path: str,
+                       grid_size: int | None = None) -> ClassificationResult:
+        start = time.perf_counter()
+        colored_image = self.colorize_grids(image, labels.ravel(), grid_size)
+        timings["colorize"] = time.perf_counter() - start
+        return ClassificationResult(
+            image=image,
+            colored_image=colored_image,
+            labels=labels,
+            probabilities=probabilities,
+            counts=np.bincount(labels.ravel(), minlength=len(self.class_names)),
+            timings=timings,
+            path=path,
+        )
+
+    def process_image(self, image_path: str) -> Tuple[np.ndarray, np.ndarray]:
+        result = self.classify_image(image_path)
+        return result.image, result.colored_image
+
+    @_profiled
+    def classify_pyramid(self, image_path: str,
+                         grid_sizes: Iterable[int] = (16, 32, 64)) -> Dict[int, ClassificationResult]:
+        """Classify one image at several cell sizes, keyed by grid size.
+
+        The image is decoded once and the tiles of every level go to the model in
+        one batch, so switching granularity afterwards needs no further inference.
+        With cell sizes that double, each coarse cell covers a 2x2 block of the
+        level below on grid-aligned images. Levels found in the result cache are
+        not recomputed.
+        """
+        if not self.validate_session():
+            raise AuthenticationError("Session expired")
+        if not self.backend:
+            raise ModelLoadError("Load a model first")
+        timings: Dict[str, float] = {}
+        start = time.perf_counter()
+        image = self.load_image(image_path)
+        timings["load"] = time.perf_counter() - start
+        return self._classify_levels(image, grid_sizes, timings, str(image_path))
+
+    def classify_stream(self, image_path: str, band_rows: int | None = None,
+                        grid_sizes: Iterable[int] | None = None) -> Iterator[ClassificationProgress]:
+        """Classify an image band by band, yielding after each band of cell rows.
+
+        Each step tiles, resizes and predicts band_rows rows of cells (by default as
+        many as fit in one inference batch) and paints them onto the colour map, so
+        a viewer can show the first rows long before the last are done and the
+        caller can stop early by abandoning the generator. The final step's result
+        matches classify_image.
+
+        grid_sizes classifies more cell sizes in the same pass, as classify_pyramid
+        does. The first size is streamed (grid_size by default); the tiles of the
+        others ride along in each band's batch, spread evenly over the bands, and
+        the final step's levels holds every size.
+        """
+        start = time.perf_counter()
+        batches = _BatchRecorder()
+        with _PeakMemory(self.trace_memory) as memory:
+            steps = self._classify_stream(image_path, band_rows, grid_sizes)
+            while True:
+                # Record only while a step runs; the caller's own work between steps is not ours
+                with batches:
+                    progress = next(steps, None)
+                if progress is None:
+                    return
+                if progress.done:
+                    # Report before the last yield, in case the caller stops there
+                    self._emit_profile("classify_stream", progress.levels, batches.sizes,
+                                       time.perf_counter() - start, memory.stop())
+                yield progress
+
+    def _classify_stream(self, image_path: str, band_rows: int | None,
+                         grid_sizes: Iterable[int] | None) -> Iterator[ClassificationProgress]:
+        if not self.validate_session():
+            raise AuthenticationError("Session expired")
+        if not self.backend:
+            raise ModelLoadError("Load a model first")
+
+        timings: Dict[str, float] = {}
+        start = time.perf_counter()
+        image = self.load_image(image_path)
+        timings["load"] = time.perf_counter() - start
+        yield from self._stream_levels(image, grid_sizes or [self.grid_size], band_rows, timings, str(image_path))
+
+    def _stream_levels(self, image: np.ndarray, grid_sizes: Iterable[int], band_rows: int | None,
+                       timings: Dict[str, float], path: str | None) -> Iterator[ClassificationProgress]:
+        """classify_stream on an image already loaded from `path` (None skips the result cache)."""
+        grid_sizes = list(dict.fromkeys(grid_sizes))
+        g = grid_sizes[0]
+        levels: Dict[int, ClassificationResult] = {}
+        keys: Dict[int, str | None] = {}
+        for size in grid_sizes:
+            key = None
+            if self.result_cache is not None and path:
+                key = self._result_key(path, size)
+                cached = self.result_cache.get(key)
+                if cached is not None:
+                    levels[size] = self._cached_result(image, *cached, dict(timings), path, size)
+                    continue
+            keys[size] = key
+
+        if g in levels:
+            # Nothing left to stream; any other sizes still missing share one batch
+            if keys:
+                levels.update(self._classify_levels(image, list(keys), timings, path))
+            result = levels[g]
+            rows = result.labels.shape[0]
+            yield ClassificationProgress(result, rows, rows, (0, rows * g), {size: levels[size] for size in grid_sizes})
+            return
+
+        timings.update(tile=0.0, resize=0.0, predict=0.0, colorize=0.0)
+        start = time.perf_counter()
+        tiles = {size: self.tile_image(image, size) for size in keys}
+        rows, cols = tiles[g].shape[:2]
+        band_rows = band_rows or max(1, self.inference_batch_size // cols)
+        timings["tile"] = time.perf_counter() - start
+
+        result = ClassificationResult(
+            image=image,
+            colored_image=image.copy(),
+            labels=np.full((rows, cols), UNCLASSIFIED, dtype=np.uint8),
+            probabilities=np.zeros((rows, cols, len(self.class_names)), dtype=np.float16),
+            counts=np.zeros(len(self.class_names), dtype=np.int64),
+            timings=timings,
+            path=path,
+        )
+        others = [size for size in keys if size != g]
+        other_probabilities: Dict[int, np.ndarray] = {}
+        out_w, out_h = self.model_input_size
+        for r0 in range(0, rows, band_rows):
+            check_cancelled()
+            r1 = min(rows, r0 + band_rows)
+            start = time.perf_counter()
+            # The other sizes advance in proportion, finishing on the last band
+            parts = [(g, r0, r1)] + [(size, -(-tiles[size].shape[0] * r0 // rows),
+                                      -(-tiles[size].shape[0] * r1 // rows)) for size in others]
+            parts = [(size, a, b) for size, a, b in parts if b > a]
+            if len(parts) == 1:
+                batch = self.resize_tiles(tiles[g][r0:r1])
+            else:
+                # resize_tiles reuses one buffer, so gather the parts into a batch of their own
+                total = sum((b - a) * tiles[size].shape[1] for size, a, b in parts)
+                batch = np.empty((total, out_h, out_w, image.shape[2]), dtype=image.dtype)
+                offset = 0
+                for size, a, b in parts:
+                    n = (b - a) * tiles[size].shape[1]
+                    batch[offset:offset + n] = self.resize_tiles(tiles[size][a:b])
+                    offset += n
+            timings["resize"] += time.perf_counter() - start
+
+            start = time.perf_counter()
+            probabilities = self.predict_tiles(batch)
+            timings["predict"] += time.perf_counter() - start
+
+            start = time.perf_counter()
+            if not other_probabilities:
+                other_probabilities = {
+                    size: np.empty((tiles[size].shape[0] * tiles[size].shape[1], probabilities.shape[1]),
+                                   dtype=probabilities.dtype)
+                    for size in others
+                }
+            offset = (r1 - r0) * cols
+            for size, a, b in parts[1:]:
+                size_cols = tiles[size].shape[1]
+                n = (b - a) * size_cols
+                other_probabilities[size][a * size_cols:b * size_cols] = probabilities[offset:offset + n]
+                offset += n
+            probabilities = probabilities[:(r1 - r0) * cols]
+            band = np.argmax(probabilities, axis=1).astype(np.uint8)
+            result.labels[r0:r1] = band.reshape(r1 - r0, cols)
+            result.probabilities[r0:r1] = probabilities.astype(np.float16).reshape(r1 - r0, cols, -1)
+            result.counts += np.bincount(band, minlength=len(self.class_names))
+            region = self._paint_rows(result.colored_image, result.labels, r0, r1, g)
+            if r1 == rows:
+                # Pixels beyond the last full cell (crop mode) are blank in colorize_grids
+                result.colored_image[rows * g:] = 0
+                result.colored_image[:, cols * g:] = 0
+            timings["colorize"] += time.perf_counter() - start
+            if r1 < rows:
+                yield ClassificationProgress(result, r1, rows, region)
+
+        levels[g] = result
+        for size in others:
+            size_rows, size_cols = tiles[size].shape[:2]
+            levels[size] = self._build_result(image, size_rows, size_cols, other_probabilities[size],
+                                              dict(timings), path, size)
+        for size, key in keys.items():
+            if key is not None:
+                self.result_cache.put(key, levels[size].labels, levels[size].probabilities, path)
+        yield ClassificationProgress(result, rows, rows, region, {size: levels[size] for size in grid_sizes})
+
+    def _classify_levels(self, image: np.ndarray, grid_sizes: Iterable[int], timings: Dict[str, float],
+                         path: str | None) -> Dict[int, ClassificationResult]:
+        """classify_pyramid on an image already loaded from `path` (None skips the result cache)."""
+        grid_sizes = list(dict.fromkeys(grid_sizes))
+        results: Dict[int, ClassificationResult] = {}
+        levels = []
+        start = time.perf_counter()
+        for g in grid_sizes:
+            key = None
+            if self.result_cache is not None and path:
+                key = self._result_key(path, g)
+                cached = self.result_cache.get(key)
+                if cached is not None:
+                    results[g] = self._cached_result(image, *cached, dict(timings), path, g)
+                    continue
+            tiles = self.tile_image(image, g)
+            levels.append((g, key, tiles))
+        timings["tile"] = time.perf_counter() - start
+
+        if levels:
+            # Resize every level into one shared model batch
+            start = time.perf_counter()
+            out_w, out_h = self.model_input_size
+            total = sum(tiles.shape[0] * tiles.shape[1] for _, _, tiles in levels)
+            batch = np.empty((total, out_h, out_w, image.shape[2]), dtype=image.dtype)
+            offsets = []
+            offset = 0
+            for _, _, tiles in levels:
+                n = tiles.shape[0] * tiles.shape[1]
+                batch[offset:offset + n] = self.resize_tiles(tiles)
+                offsets.append(offset)
+                offset += n
+            timings["resize"] = time.perf_counter() - start
+
+            start = time.perf_counter()
+            probabilities = self.predict_tiles(batch)
+            timings["predict"] = time.perf_counter() - start
+
+            for (g, key, tiles), offset in zip(levels, offsets):
+                rows, cols = tiles.shape[:2]
+                level_probs = probabilities[offset:offset + rows * cols]
+                results[g] = self._build_result(image, rows, cols, level_probs, dict(timings), path, g)
+                if key is not None:
+                    self.result_cache.put(key, results[g].labels, results[g].probabilities, path)
+
+        return {g: results[g] for g in grid_sizes}
+
+    # ---------------------------
+    # Batch Processing
+    # ---------------------------
+    def _prepare_image(self, image_path: str) -> _PendingImage:
+        """Decode, tile and resize one image; runs on classify_batch's decode threads."""
+        timings: Dict[str, float] = {}
+        start = time.perf_counter()
+        image = self.load_image(image_path)
+        timings["load"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        tiles = self.tile_image(image, self.grid_size)
+        rows, cols = tiles.shape[:2]
+        timings["tile"] = time.perf_counter() - start
+
+        # resize_tiles hands back this thread's scratch buffer, so keep a copy
+        start = time.perf_counter()
+        resized = self.resize_tiles(tiles).copy()
+        timings["resize"] = time.perf_counter() - start
+        return _PendingImage(str(image_path), image, rows, cols, resized, timings, remaining=len(resized))
+
+    def _predict_batch(self, batch: np.ndarray, filled: int,
+                       owners: List[Tuple[_PendingImage, int, int, int]]) -> float:
+        """Run one packed batch, scatter the probabilities back to their images and return its run time."""
+        check_cancelled()
+        start = time.perf_counter()
+        if filled < len(batch):
+            batch[filled:] = 0  # keep the batch shape fixed; padded rows are discarded
+        with _BatchRecorder() as batches:
+            probabilities = self.predict_tiles(batch)
+        elapsed = time.perf_counter() - start
+
+        for item, item_offset, batch_offset, count in owners:
+            item.batch_sizes.extend(batches.sizes)
+            if item.probabilities is None:
+                item.probabilities = np.empty((item.rows * item.cols, probabilities.shape[1]), dtype=probabilities.dtype)
+            item.probabilities[item_offset:item_offset + count] = probabilities[batch_offset:batch_offset + count]
+            item.timings["predict"] = item.timings.get("predict", 0.0) + elapsed * count / filled
+            item.remaining -= count
+        return elapsed
+
+    def classify_batch(self, image_paths: Iterable[str], batch_size: int = 256,
+                       prefetch: int = 4,
+                       stats: BatchPipelineStats | None = None) -> Iterator[ClassificationResult]:
+        """Classify many images, packing tiles from several images into each predict call.
+
+        Images are decoded and tiled on `prefetch` background threads while the model
+        runs, and results are yielded in input order as soon as all of an image's
+        tiles have been predicted. At most `prefetch` images are decoded ahead, which
+        bounds memory on long directory runs. Images that fail to load are logged and
+        skipped. Pass a BatchPipelineStats as `stats` to watch queue depth and
+        per-stage busy time while the batch runs.
+        """
+        if not self.validate_session():
+            raise AuthenticationError("Session expired")
+        if not self.backend:
+            raise ModelLoadError("Load a model first")
+        if batch_size < 1:
+            raise ValueError("batch_size must be positive")
+
+        paths = iter(image_paths)
+        pending: deque = deque()
+        batch: np.ndarray | None = None
+        filled = 0
+        owners: List[Tuple[_PendingImage, int, int, int]] = []
+        stats = stats if stats is not None else BatchPipelineStats()
+        stats.decode_workers = max(1, prefetch)
+        started = time.perf_counter()
+
+        def predict():
+            stats.inference_busy += self._predict_batch(batch, filled, owners)
+            stats.batches += 1
+
+        def finished():
+            while pending and pending[0].remaining == 0:
+                item = pending.popleft()
+                stats.images += 1
+                stats.wall = time.perf_counter() - started
+                result = self._build_result(item.image, item.rows, item.cols,
+                                            item.probabilities, item.timings, item.path)
+                self._emit_profile("classify_batch", result, item.batch_sizes)
+                yield result
+
+        with _PeakMemory(self.trace_memory) as memory:
+            with ThreadPoolExecutor(max_workers=max(1, prefetch)) as pool:
+                futures = deque((path, pool.submit(self._prepare_image, path))
+                                for path in islice(paths, max(1, prefetch)))
+                while futures:
+                    path, future = futures.popleft()
+                    stats.sample_queue_depth(future.done() + sum(f.done() for _, f in futures))
+                    _DECODE_QUEUE_DEPTH.set(stats.queue_depth)
+                    next_path = next(paths, None)
+                    if next_path is not None:
+                        futures.append((next_path, pool.submit(self._prepare_image, next_path)))
+                    start = time.perf_counter()
+                    try:
+                        item = future.result()
+                    except (ImageProcessingError, OSError, ValueError) as e:
+                        logger.error(f"Skipping '{path}': {str(e)}")
+                        stats.failed += 1
+                        continue
+                    finally:
+                        stats.decode_wait += time.perf_counter() - start
+                    stats.decode_busy += item.timings["load"] + item.timings["tile"] + item.timings["resize"]
+                    stats.tiles += len(item.tiles)
+
+                    if batch is None:
+                        batch = np.empty((batch_size, *item.tiles.shape[1:]), dtype=item.tiles.dtype)
+                    pending.append(item)
+                    offset = 0
+                    while offset < len(item.tiles):
+                        count = min(batch_size - filled, len(item.tiles) - offset)
+                        batch[filled:filled + count] = item.tiles[offset:offset + count]
+                        owners.append((item, offset, filled, count))
+                        filled += count
+                        offset += count
+                        if filled == batch_size:
+                            predict()
+                            filled, owners = 0, []
+                    item.tiles = item.tiles[:0]  # packed into batches; release the tile copy
+                    yield from finished()
+
+            if filled:
+                predict()
+            yield from finished()
+            stats.wall = time.perf_counter() - started
+        stats.peak_memory = memory.peak
+
+    # ---------------------------
+    # Large Raster Processing
+    # ---------------------------
+    @_profiled
+    def classify_raster(self, image_path: str, window_size: int = 1024,
+                        preview_size: int = 1024) -> ClassificationResult:
+        """Classify a large image at native resolution, one window at a time.
+
+        Unlike classify_image the raster is not squashed to input_size: every
+        grid_size block of source pixels becomes one cell. Only one window of pixels
+        is held at a time; the label grid and probability cube are filled in as each
+        window finishes. image and colored_image in the result are previews scaled
+        to at most preview_size pixels on the long side.
+        """
+        if not self.validate_session():
+            raise AuthenticationError("Session expired")
+        if not self.backend:
+            raise ModelLoadError("Load a model first")
+        self._validate_image_path(image_path)
+
+        g = self.grid_size
+        window_size = max(g, window_size - window_size % g)
+        timings = {"load": 0.0, "tile": 0.0, "resize": 0.0, "predict": 0.0}
+
+        with RasterWindowReader(image_path) as reader:
+            h, w = reader.height, reader.width
+            rows, cols = self.grid_shape(h, w, g)
+            if rows == 0 or cols == 0:
+                raise ImageProcessingError("Image is smaller than a single grid cell")
+
+            n_classes = len(self.class_names)
+            labels = np.zeros((rows, cols), dtype=np.uint8)
+            probabilities = np.zeros((rows, cols, n_classes), dtype=np.float16)
+            scale = min(1.0, preview_size / max(h, w))
+            preview = np.zeros((max(1, round(h * scale)), max(1, round(w * scale)), 3), dtype=np.uint8)
+
+            for y in range(0, rows * g, window_size):
+                for x in range(0, cols * g, window_size):
+                    check_cancelled()
+                    start = time.perf_counter()
+                    win_h, win_w = min(window_size, h - y), min(window_size, w - x)
+                    window = reader.read(y, x, win_h, win_w)
+                    timings["load"] += time.perf_counter() - start
+
+                    start = time.perf_counter()
+                    tiles = self.tile_image(window, g)
+                    r0, c0 = y // g, x // g
+                    tiles = tiles[:rows - r0, :cols - c0]
+                    timings["tile"] += time.perf_counter() - start
+
+                    start = time.perf_counter()
+                    batch = self.resize_tiles(tiles)
+                    timings["resize"] += time.perf_counter() - start
+
+                    start = time.perf_counter()
+                    window_probs = self.predict_tiles(batch)
+                    timings["predict"] += time.perf_counter() - start
+
+                    win_rows, win_cols = tiles.shape[:2]
+                    window_probs = window_probs.reshape(win_rows, win_cols, -1)
+                    labels[r0:r0 + win_rows, c0:c0 + win_cols] = np.argmax(window_probs, axis=2)
+                    probabilities[r0:r0 + win_rows, c0:c0 + win_cols] = window_probs
+
+                    py0, px0 = round(y * scale), round(x * scale)
+                    py1, px1 = round((y + win_h) * scale), round((x + win_w) * scale)
+                    if py1 > py0 and px1 > px0:
+                        preview[py0:py1, px0:px1] = cv2.resize(window, (px1 - px0, py1 - py0),
+                                                               interpolation=cv2.INTER_AREA)
+
+        start = time.perf_counter()
+        palette = np.array([self.class_colors[i] for i in range(len(self.class_colors))], dtype=np.uint8)
+        colored_preview = cv2.resize(palette[labels], (preview.shape[1], preview.shape[0]),
+                                     interpolation=cv2.INTER_NEAREST)
+        timings["colorize"] = time.perf_counter() - start
+
+        return ClassificationResult(
+            image=preview,
+            colored_image=colored_preview,
+            labels=labels,
+            probabilities=probabilities,
+            counts=np.bincount(labels.ravel(), minlength=n_classes),
+            timings=timings,
+            path=str(image_path),
+        )
+
+# ---------------------------
+# Inference Worker Pool
+# ---------------------------
+def _job_layout(h: int, w: int, c: int, level_shapes: Dict[int, Tuple[int, int]],
+                n_classes: int) -> Tuple[Dict[str, Tuple[int, Tuple[int, ...], str]], int]:
+    """Offset, shape and dtype of every array in a job's shared memory block, and its size."""
+    layout = {}
+    offset = 0
+
+    def add(name, shape, dtype):
+        nonlocal offset
+        layout[name] = (offset, shape, np.dtype(dtype).str)
+        offset += int(np.prod(shape)) * np.dtype(dtype).itemsize
+        offset = -(-offset // 64) * 64  # cache-line align the next array
+
+    add("cancel", (1,), np.uint8)
+    add("image", (h, w, c), np.uint8)
+    for g, (rows, cols) in level_shapes.items():
+        add(f"colored_{g}", (h, w, 3), np.uint8)
+        add(f"labels_{g}", (rows, cols), np.uint8)
+        add(f"probabilities_{g}", (rows, cols, n_classes), np.float16)
+    return layout, offset
+
+def _layout_views(buf, layout) -> Dict[str, np.ndarray]:
+    return {name: np.ndarray(shape, dtype=dtype, buffer=buf, offset=offset)
+            for name, (offset, shape, dtype) in layout.items()}
+
+class _SharedFlag:
+    """A cancel token backed by a byte of a job's shared memory block.
+
+    The worker installs it as its job token, so the check_cancelled() calls
+    between inference batches see a cancel set by the parent process.
+    """
+
+    def __init__(self, view: np.ndarray):
+        self._view = view
+
+    def is_set(self) -> bool:
+        return bool(self._view[0])
+
+    def set(self):
+        self._view[0] = 1
+
+def _inference_worker(settings: Dict[str, Any], tasks, results):
+    """Worker process main loop: owns one classifier and serves jobs until it gets None."""
+    classifier = SatelliteImageClassifier(authentication_enabled=False)
+    for name in ("grid_size", "edge_mode", "input_size", "model_input_size", "inference_batch_size"):
+        setattr(classifier, name, settings[name])
+    if settings["result_cache"]:
+        classifier.result_cache = ResultCache(*settings["result_cache"])
+    try:
+        classifier.load_model(settings["model_path"], backend=settings["backend"])
+    except Exception as e:
+        results.put((None, None, f"{type(e).__name__}: {str(e)}"))
+        return
+    results.put((None, None, None))
+
+    for job_id, shm_name, path, grid_sizes, layout, stream, band_rows in iter(tasks.get, None):
+        shm = shared_memory.SharedMemory(name=shm_name)
+        views = _layout_views(shm.buf, layout)
+        image = views["image"]
+        _job_context.token = _SharedFlag(views["cancel"])
+        try:
+            check_cancelled()  # cancelled while it waited in the task queue
+            timings: Dict[str, float] = {}
+            with _BatchRecorder() as batches:
+                start = time.perf_counter()
+                if path:
+                    # Decode into the shared block; the parent reads the image from there
+                    image[...] = classifier.load_image(path)
+                timings["load"] = time.perf_counter() - start
+
+                if stream:
+                    g, r0 = grid_sizes[0], 0
+                    for progress in classifier._stream_levels(image, grid_sizes, band_rows, timings, path):
+                        if progress.done:
+                            levels = progress.levels
+                            break
+                        # Publish the band through the block; the parent copies it out
+                        (y0, y1), r1 = progress.region, progress.rows_done
+                        views[f"colored_{g}"][y0:y1] = progress.result.colored_image[y0:y1]
+                        views[f"labels_{g}"][r0:r1] = progress.result.labels[r0:r1]
+                        views[f"probabilities_{g}"][r0:r1] = progress.result.probabilities[r0:r1]
+                        results.put((job_id, {"progress": (r0, r1, progress.rows_total, (y0, y1))}, None))
+                        r0 = r1
+                else:
+                    levels = classifier._classify_levels(image, grid_sizes, timings, path)
+            reply = {"batch_sizes": batches.sizes}
+            for g, result in levels.items():
+                views[f"colored_{g}"][...] = result.colored_image
+                views[f"labels_{g}"][...] = result.labels
+                views[f"probabilities_{g}"][...] = result.probabilities
+                reply[g] = {"counts": result.counts.tolist(), "timings": result.timings}
+            results.put((job_id, reply, None))
+        except Exception as e:
+            results.put((job_id, None, f"{type(e).__name__}: {str(e)}"))
+        finally:
+            _job_context.token = None
+            del views, image
+            shm.close()
+
+class InferenceWorkerPool:
+    """Runs classification in worker processes that each own a copy of the model.
+
+    Pixels never pass through a pipe. Each job gets one shared memory block. The
+    worker decodes the image into it, or reads an array the caller placed there,
+    and writes the colour map, labels and probabilities back into the same block.
+    Only counts and timings travel over the result queue. The caller's process
+    then does no tiling, resizing or inference, so a Tk main loop stays responsive,
+    and several workers spread the numpy stages over several cores.
+
+    Workers are started with the spawn method and take the classifier's grid and
+    size settings and result cache. They load model_path, or else the model the
+    classifier has loaded. Given a path, the classifier needs no model of its
+    own, so the caller's process never loads the inference runtime and holds no
+    copy of the weights. Submitting returns a concurrent.futures.Future.
+    """
+
+    def __init__(self, classifier: "SatelliteImageClassifier", processes: int = 1,
+                 model_path: str | None = None, backend: str | None = None):
+        if not classifier.validate_session():
+            raise AuthenticationError("Session expired")
+        self.classifier = classifier
+        self.model_fingerprint = self._fingerprint(classifier, model_path, backend)
+        if self.model_fingerprint is None:
+            raise ModelLoadError("Load a model first")
+        settings = self._settings(classifier, model_path, backend)
+        self._settings_snapshot = settings
+        ctx = multiprocessing.get_context("spawn")
+        self._tasks = ctx.Queue()
+        self._results = ctx.Queue()
+        self._workers = [
+            ctx.Process(target=_inference_worker, args=(settings, self._tasks, self._results), daemon=True)
+            for _ in range(max(1, processes))
+        ]
+        for worker in self._workers:
+            worker.start()
+        self._lock = threading.Lock()
+        self._pending: Dict[int, Tuple[Any, ...]] = {}
+        self._job_ids = count()
+        self._closed = False
+
+        ready = 0
+        while ready < len(self._workers):
+            try:
+                _, _, error = self._results.get(timeout=1.0)
+            except queue.Empty:
+                if not all(worker.is_alive() for worker in self._workers):
+                    error = "Inference worker exited during start-up"
+                else:
+                    continue
+            if error:
+                self.close()
+                raise ModelLoadError(error)
+            ready += 1
+        logger.info(f"Started {len(self._workers)} inference worker process(es)")
+
+        self._collector = threading.Thread(target=self._collect, daemon=True)
+        self._collector.start()
+
+    @staticmethod
+    def _fingerprint(classifier: "SatelliteImageClassifier", model_path: str | None,
+                     backend: str | None) -> str | None:
+        """The model_fingerprint load_model would give the model; None when there is no model."""
+        if model_path is None:
+            return classifier.model_fingerprint if classifier.backend is not None else None
+        path, backend_name = resolve_model(model_path, backend)
+        return f"{backend_name}:{ModelRegistry._key(path, backend_name)[0]}"
+
+    @staticmethod
+    def _settings(classifier: "SatelliteImageClassifier", model_path: str | None,
+                  backend: str | None) -> Dict[str, Any]:
+        if model_path is None:
+            model_path, backend = classifier.model_path, classifier.backend.name
+        path, backend_name = resolve_model(model_path, backend)
+        cache = classifier.result_cache
+        return {
+            "model_path": str(path),
+            "backend": backend_name,
+            "grid_size": classifier.grid_size,
+            "edge_mode": classifier.edge_mode,
+            "input_size": classifier.input_size,
+            "model_input_size": classifier.model_input_size,
+            "inference_batch_size": classifier.inference_batch_size,
+            "result_cache": (str(cache.cache_dir), cache.max_bytes) if cache is not None else None,
+        }
+
+    def serves(self, classifier: "SatelliteImageClassifier", model_path: str | None = None,
+               backend: str | None = None) -> bool:
+        """Whether the workers already host this model (as for __init__) and the classifier's settings.
+
+        Models are compared by content fingerprint, so loading the same weights
+        again, even from another path, keeps the running workers.
+        """
+        if self._closed or not all(worker.is_alive() for worker in self._workers):
+            return False
+        try:
+            if self._fingerprint(classifier, model_path, backend) != self.model_fingerprint:
+                return False
+        except (ModelLoadError, OSError):
+            return False
+        ignore = {"model_path"}
+        current = self._settings(classifier, model_path, backend)
+        return all(current[k] == v for k, v in self._settings_snapshot.items() if k not in ignore)
+
+    def submit(self, image_path: str) -> Future:
+        """Classify a file at the classifier's grid_size; resolves to a ClassificationResult."""
+        return self._submit(image_path, None, [self.classifier.grid_size], single=True)
+
+    def submit_pyramid(self, image_path: str, grid_sizes: Iterable[int] = (16, 32, 64)) -> Future:
+        """Like classify_pyramid; resolves to a dict of ClassificationResults by grid size."""
+        return self._submit(image_path, None, list(dict.fromkeys(grid_sizes)), single=False)
+
+    def submit_array(self, image: np.ndarray) -> Future:
+        """Classify an already loaded (H, W, 3) uint8 image."""
+        return self._submit(None, image, [self.classifier.grid_size], single=True)
+
+    def classify_image(self, image_path: str) -> ClassificationResult:
+        return wait_cancellable(self.submit(image_path))
+
+    def classify_stream(self, image_path: str, band_rows: int | None = None,
+                        grid_sizes: Iterable[int] | None = None) -> Iterator[ClassificationProgress]:
+        """Like SatelliteImageClassifier.classify_stream, run in a worker.
+
+        The worker writes each band into the job's block and reports it, and the
+        collector thread copies the band out, so the result fills in place as it
+        does in-process. The final step's result and levels are the completed
+        copies. Cancelling the job, or abandoning the generator, stops the worker
+        at its next band.
+        """
+        grid_sizes = list(dict.fromkeys(grid_sizes or [self.classifier.grid_size]))
+        updates: "queue.Queue[Tuple[Any, ...]]" = queue.Queue()
+        future = self._submit(image_path, None, grid_sizes, single=False, updates=updates, band_rows=band_rows)
+        result = None
+        try:
+            while True:
+                check_cancelled()
+                try:
+                    r0, r1, rows, region, image, colors, labels, probabilities = updates.get(timeout=0.1)
+                except queue.Empty:
+                    # Bands are queued before the future resolves, so an empty queue then is final
+                    if future.done() and updates.empty():
+                        break
+                    continue
+                if result is None:
+                    result = ClassificationResult(
+                        image=image,
+                        colored_image=image.copy(),
+                        labels=np.full((rows, labels.shape[1]), UNCLASSIFIED, dtype=np.uint8),
+                        probabilities=np.zeros((rows,) + probabilities.shape[1:], dtype=np.float16),
+                        counts=np.zeros(len(self.classifier.class_names), dtype=np.int64),
+                        timings={},
+                        path=str(image_path),
+                    )
+                result.colored_image[region[0]:region[1]] = colors
+                result.labels[r0:r1] = labels
+                result.probabilities[r0:r1] = probabilities
+                result.counts += np.bincount(labels.ravel(), minlength=len(result.counts))
+                yield ClassificationProgress(result, r1, rows, region)
+            levels = future.result()
+        finally:
+            if not future.done():
+                future.cancel()
+        final = levels[grid_sizes[0]]
+        rows = final.labels.shape[0]
+        yield ClassificationProgress(final, rows, rows, (0, final.colored_image.shape[0]), levels)
+
+    def _submit(self, image_path: str | None, image: np.ndarray | None, grid_sizes: List[int], single: bool,
+                updates: queue.Queue | None = None, band_rows: int | None = None) -> Future:
+        """Queue a job; with an updates queue it is streamed and its bands are put there."""
+        if self._closed:
+            raise ModelLoadError("Inference worker pool is closed")
+        if not self.classifier.validate_session():
+            raise AuthenticationError("Session expired")
+        if image_path is not None:
+            self.classifier._validate_image_path(image_path)
+            h, w = self.classifier.input_size
+            c = 3
+        else:
+            h, w, c = image.shape
+        level_shapes = {g: self.classifier.grid_shape(h, w, g) for g in grid_sizes}
+        layout, size = _job_layout(h, w, c, level_shapes, len(self.classifier.class_names))
+
+        shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        if image is not None:
+            offset, shape, dtype = layout["image"]
+            np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=offset)[...] = image
+
+        future: Future = Future()
+        path = str(image_path) if image_path is not None else None
+        with self._lock:
+            job_id = next(self._job_ids)
+            self._pending[job_id] = (future, shm, layout, grid_sizes, single, path, time.perf_counter(), updates)
+        future.add_done_callback(lambda f: f.cancelled() and self._cancel_job(job_id))
+        self._tasks.put((job_id, shm.name, path, grid_sizes, layout, updates is not None, band_rows))
+        return future
+
+    def _cancel_job(self, job_id: int):
+        """Tell the worker to drop a job whose future was cancelled, at its next batch boundary."""
+        with self._lock:
+            entry = self._pending.get(job_id)
+            if entry is not None:
+                # Still pending, so the block is still open; _collect pops it before closing
+                offset, shape, dtype = entry[2]["cancel"]
+                _SharedFlag(np.ndarray(shape, dtype=dtype, buffer=entry[1].buf, offset=offset)).set()
+
+    def _collect(self):
+        while not self._closed:
+            try:
+                job_id, reply, error = self._results.get(timeout=0.5)
+            except queue.Empty:
+                if self._pending and not any(worker.is_alive() for worker in self._workers):
+                    self._fail_pending("Inference workers exited")
+                continue
+            except (EOFError, OSError):
+                break
+            if reply is not None and "progress" in reply:
+                with self._lock:
+                    # Copy under the lock, so close() cannot release the block meanwhile
+                    entry = self._pending.get(job_id)
+                    if entry is not None:
+                        self._forward_band(entry, *reply["progress"])
+                continue
+            with self._lock:
+                entry = self._pending.pop(job_id, None)
+            if entry is not None:
+                self._finish(entry, reply, error)
+
+    @staticmethod
+    def _forward_band(entry, r0: int, r1: int, rows: int, region: Tuple[int, int]):
+        """Copy one streamed band out of a job's block onto its updates queue."""
+        _, shm, layout, grid_sizes, *_, updates = entry
+        g = grid_sizes[0]
+        views = _layout_views(shm.buf, layout)
+        image = views["image"].copy() if r0 == 0 else None
+        updates.put((r0, r1, rows, region, image, views[f"colored_{g}"][region[0]:region[1]].copy(),
+                     views[f"labels_{g}"][r0:r1].copy(), views[f"probabilities_{g}"][r0:r1].copy()))
+        del views
+
+    def _finish(self, entry, reply, error):
+        future, shm, layout, grid_sizes, single, path, submitted, _ = entry
+        try:
+            if error:
+                outcome = ImageProcessingError(error)
+            else:
+                # Copy out of the block so it can be unlinked right away
+                views = _layout_views(shm.buf, layout)
+                image = views["image"].copy()
+                levels = {
+                    g: ClassificationResult(
+                        image=image,
+                        colored_image=views[f"colored_{g}"].copy(),
+                        labels=views[f"labels_{g}"].copy(),
+                        probabilities=views[f"probabilities_{g}"].copy(),
+                        counts=np.asarray(reply[g]["counts"]),
+                        timings=reply[g]["timings"],
+                        path=path,
+                    )
+                    for g in grid_sizes
+                }
+                del views
+                outcome = levels[grid_sizes[0]] if single else levels
+                # Timings are the worker's; total includes queueing and the shared memory copies
+                self.classifier._emit_profile("worker_pool", levels, reply["batch_sizes"],
+                                              time.perf_counter() - submitted)
+        finally:
+            shm.close()
+            shm.unlink()
+        try:
+            if isinstance(outcome, Exception):
+                future.set_exception(outcome)
+            else:
+                future.set_result(outcome)
+        except InvalidStateError:
+            pass  # cancelled by the caller while the worker was busy
+
+    def _fail_pending(self, message: str):
+        with self._lock:
+            entries = list(self._pending.values())
+            self._pending.clear()
+        for future, shm, *_ in entries:
+            shm.close()
+            shm.unlink()
+            if not future.done():
+                future.set_exception(ImageProcessingError(message))
+
+    def close(self):
+        """Stop the workers; jobs still pending fail with ImageProcessingError."""
+        if self._closed:
+            return
+        self._closed = True
+        for _ in self._workers:
+            self._tasks.put(None)
+        for worker in self._workers:
+            worker.join(timeout=5)
+            if worker.is_alive():
+                worker.terminate()
+        self._fail_pending("Inference worker pool closed")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+# ---------------------------
+# Job Scheduler
+# ---------------------------
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 10
+
+class _Job:
+    def __init__(self, key, priority: int, fn, args, kwargs):
+        self.key = key
+        self.priority = priority
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.future: Future = Future()
+        self.token = threading.Event()
+        self.waiters = 0
+
+class JobHandle:
+    """One submitter's reference to a scheduled job.
+
+    Identical submissions share a job, so cancel() only stops the work once every
+    handle to it has been cancelled.
+    """
+
+    def __init__(self, scheduler: "JobScheduler", job: _Job):
+        self._scheduler = scheduler
+        self._job = job
+        self.cancelled = False
+
+    @property
+    def key(self):
+        return self._job.key
+
+    @property
+    def future(self) -> Future:
+        return self._job.future
+
+    def done(self) -> bool:
+        return self._job.future.done()
+
+    def result(self, timeout: float | None = None):
+        return self._job.future.result(timeout)
+
+    def cancel(self):
+        if not self.cancelled:
+            self.cancelled = True
+            self._scheduler._release(self._job)
+
+class JobScheduler:
+    """Priority queue of classification jobs run by a fixed number of threads.
+
+    Lower priority values run first (PRIORITY_INTERACTIVE before PRIORITY_BATCH),
+    first come first served within a priority. Submitting a key that is already
+    pending or running returns a handle to the existing job instead of queueing
+    the work twice; a pending duplicate with a more urgent priority moves the
+    job up. Cancelled jobs that have not started are dropped. Running jobs stop
+    at the next check_cancelled() call, which the classifier makes between
+    inference batches, and their futures raise JobCancelled.
+    """
+
+    def __init__(self, max_workers: int = 1):
+        self._queue: "queue.PriorityQueue[Tuple[int, int, _Job]]" = queue.PriorityQueue()
+        self._jobs: Dict[Any, _Job] = {}
+        self._lock = threading.Lock()
+        self._order = count()
+        self._closed = False
+        self._threads = [
+            threading.Thread(target=self._worker, name=f"job-worker-{i}", daemon=True)
+            for i in range(max(1, max_workers))
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, key, fn, *args, priority: int = PRIORITY_BATCH, **kwargs) -> JobHandle:
+        """Schedule fn(*args, **kwargs) under `key`, or join the identical job already scheduled."""
+        if self._closed:
+            raise RuntimeError("Job scheduler is closed")
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is None or job.token.is_set():
+                job = self._jobs[key] = _Job(key, priority, fn, args, kwargs)
+                self._queue.put((priority, next(self._order), job))
+            elif priority < job.priority and not job.future.running():
+                # Queue it again at the higher priority; the stale entry is skipped
+                job.priority = priority
+                self._queue.put((priority, next(self._order), job))
+            job.waiters += 1
+        return JobHandle(self, job)
+
+    def cancel_all(self):
+        with self._lock:
+            jobs = list(self._jobs.values())
+        for job in jobs:
+            self._cancel(job)
+
+    def pending(self) -> int:
+        with self._lock:
+            return sum(not job.future.running() for job in self._jobs.values())
+
+    def _release(self, job: _Job):
+        with self._lock:
+            job.waiters -= 1
+            if job.waiters > 0:
+                return
+        self._cancel(job)
+
+    def _cancel(self, job: _Job):
+        job.token.set()
+        job.future.cancel()  # only succeeds while the job is still pending
+        with self._lock:
+            if self._jobs.get(job.key) is job:
+                del self._jobs[job.key]
+
+    def _worker(self):
+        while True:
+            priority, _, job = self._queue.get()
+            if job is None:
+                return
+            if priority != job.priority or not job.future.set_running_or_notify_cancel():
+                continue
+            _job_context.token = job.token
+            try:
+                check_cancelled()
+                job.future.set_result(job.fn(*job.args, **job.kwargs))
+            except BaseException as e:
+                job.future.set_exception(e)
+            finally:
+                _job_context.token = None
+                with self._lock:
+                    if self._jobs.get(job.key) is job:
+                        del self._jobs[job.key]
+
+    def close(self):
+        """Cancel everything and stop the worker threads."""
+        self._closed = True
+        self.cancel_all()
+        for _ in self._threads:
+            self._queue.put((float("inf"), next(self._order), None))
+
+# ---------------------------
+# Command Line
+# ---------------------------
+def expand_inputs(sources: Iterable[str], extensions: Iterable[str], recursive: bool = False) -> List[str]:
+    """Image paths named by files, glob patterns or directories, in order and without repeats."""
+    extensions = {ext.lower() for ext in extensions}
+    paths: List[str] = []
+    for source in sources:
+        if glob.has_magic(source):
+            matches = sorted(glob.glob(source, recursive=True))
+        elif Path(source).is_dir():
+            pattern = "**/*" if recursive else "*"
+            matches = sorted(str(p) for p in Path(source).glob(pattern) if p.is_file())
+        else:
+            matches = [source]  # a missing file is reported when classify_batch skips it
+        paths.extend(m for m in matches if Path(m).suffix.lower() in extensions)
+    return list(dict.fromkeys(paths))
+
+def result_record(result: ClassificationResult, class_names: List[str], grid_size: int) -> Dict[str, Any]:
+    """JSON-serialisable summary of one result: label grid, class counts and stage timings."""
+    rows, cols = result.labels.shape
+    return {
+        "path": result.path,
+        "grid_size": grid_size,
+        "rows": rows,
+        "cols": cols,
+        "labels": result.labels.tolist(),
+        "counts": result.named_counts(class_names),
+        "timings": {stage: round(seconds, 6) for stage, seconds in result.timings.items()},
+    }
+
+class JsonLinesWriter:
+    """Writes one JSON object per line to a file, or to stdout for '-'."""
+
+    def __init__(self, output: str):
+        self._file = sys.stdout if output == "-" else open(output, "w", encoding="utf-8")
+
+    def write(self, record: Dict[str, Any]):
+        self._file.write(json.dumps(record) + "\n")
+        self._file.flush()
+
+    def close(self):
+        if self._file is not sys.stdout:
+            self._file.close()
+
+class ParquetWriter:
+    """Writes records to a Parquet file in row groups of `row_group_size` (needs pyarrow)."""
+
+    def __init__(self, output: str, row_group_size: int = 256):
+        if output == "-":
+            raise ValueError("Parquet output needs a file path")
+        try:
+            import pyarrow  # type: ignore
+            import pyarrow.parquet  # type: ignore  # noqa: F401
+        except ImportError:
+            raise ImageProcessingError("pyarrow is required to write Parquet output")
+        self._pa = pyarrow
+        self._output = output
+        self._row_group_size = row_group_size
+        self._records: List[Dict[str, Any]] = []
+        self._writer = None
+
+    def write(self, record: Dict[str, Any]):
+        self._records.append(record)
+        if len(self._records) >= self._row_group_size:
+            self._flush()
+
+    def _flush(self):
+        if not self._records:
+            return
+        # The first row group fixes the schema; later groups are cast to it
+        schema = self._writer.schema if self._writer is not None else None
+        table = self._pa.Table.from_pylist(self._records, schema=schema)
+        if self._writer is None:
+            self._writer = self._pa.parquet.ParquetWriter(self._output, table.schema)
+        self._writer.write_table(table)
+        self._records = []
+
+    def close(self):
+        self._flush()
+        if self._writer is not None:
+            self._writer.close()
+
+WRITERS = {"jsonl": JsonLinesWriter, "parquet": ParquetWriter}
+
+def main(argv=None) -> int:
+    """Classify images without the GUI: python -m classifier --model model.h5 images/ -o out.jsonl"""
+    parser = argparse.ArgumentParser(
+        prog="python -m classifier",
+        description="Classify satellite images headlessly and write label grids, class counts and timings.",
+    )
+    parser.add_argument("inputs", nargs="+", help="Image files, glob patterns or directories")
+    parser.add_argument("--model", default="satelliteImageClassifierWeights.h5",
+                        help="Model file: .h5/.keras, .tflite or .onnx")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), help="Override the backend picked by the model suffix")
+    parser.add_argument("-o", "--output", default="-", help="Output path, '-' for stdout (jsonl only)")
+    parser.add_argument("--format", choices=sorted(WRITERS), help="Output format (default: from the output suffix)")
+    parser.add_argument("--grid-size", type=int, default=32, help="Grid cell size in pixels")
+    parser.add_argument("--edge-mode", choices=("pad", "crop"), default="pad", help="How partial edge cells are tiled")
+    parser.add_argument("--batch-size", type=int, default=256, help="Tiles per inference call")
+    parser.add_argument("--decode-workers", type=int, default=max(1, min(8, os.cpu_count() or 1)),
+                        help="Images decoded and tiled in parallel")
+    parser.add_argument("-r", "--recursive", action="store_true", help="Descend into subdirectories")
+    parser.add_argument("--stats", action="store_true", help="Print pipeline metrics as JSON on stderr")
+    parser.add_argument("--profile", help="Write per-stage p50/p95/p99 timings to this JSON file")
+    parser.add_argument("--trace-memory", action="store_true", help="Record the tracemalloc peak memory of the run")
+    parser.add_argument("--metrics-port", type=int, help="Serve Prometheus metrics on this local port while running")
+    parser.add_argument("--metrics-textfile", help="Keep Prometheus metrics in this file (textfile collector)")
+    parser.add_argument("-q", "--quiet", action="store_true", help="Only log warnings and errors")
+    args = parser.parse_intermixed_args(argv)
+
+    if args.quiet:
+        logging.getLogger().setLevel(logging.WARNING)
+    output_format = args.format or ("parquet" if args.output.lower().endswith(".parquet") else "jsonl")
+
+    classifier = SatelliteImageClassifier(authentication_enabled=False)
+    classifier.grid_size = args.grid_size
+    classifier.edge_mode = args.edge_mode
+    classifier.trace_memory = args.trace_memory
+    paths = expand_inputs(args.inputs, classifier.supported_extensions, args.recursive)
+    if not paths:
+        logger.error("No images matched the given inputs")
+        return 2
+
+    try:
+        classifier.load_model(args.model, backend=args.backend)
+        writer = WRITERS[output_format](args.output)
+    except (ModelLoadError, ImageProcessingError, ValueError, OSError) as e:
+        logger.error(str(e))
+        return 2
+
+    server = metrics.serve(args.metrics_port) if args.metrics_port is not None else None
+    textfile = metrics.write_textfile_every(args.metrics_textfile) if args.metrics_textfile else None
+    stats = BatchPipelineStats()
+    try:
+        for result in classifier.classify_batch(paths, batch_size=args.batch_size,
+                                                prefetch=args.decode_workers, stats=stats):
+            writer.write(result_record(result, classifier.class_names, classifier.grid_size))
+    finally:
+        writer.close()
+        classifier.release_model()
+        if textfile is not None:
+            textfile.set()
+            metrics.write_textfile(args.metrics_textfile)
+        if server is not None:
+            server.shutdown()
+    logger.info(f"Classified {stats.images}/{len(paths)} images in {stats.wall:.2f}s "
+                f"({stats.images / max(stats.wall, 1e-9):.1f} images/s)")
+    logger.info(f"Pipeline: decode busy {stats.decode_busy:.2f}s on {stats.decode_workers} threads, "
+                f"inference busy {stats.inference_busy:.2f}s, waited on decode {stats.decode_wait:.2f}s "
+                f"({stats.decode_hidden:.0%} of decode hidden), mean queue depth {stats.queue_depth_mean:.1f}")
+    if args.stats:
+        print(json.dumps(stats.as_dict()), file=sys.stderr)
+    if args.profile:
+        classifier.stage_metrics.dump(args.profile)
+    return 0 if stats.images == len(paths) else 1
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -6,30 +6,63 @@ import threading
 import logging
 from PIL import Image, ImageTk, ImageOps, ExifTags
 import numpy as np
-import matplotlib.pyplot as plt
 import customtkinter as ctk
 import webbrowser
 import tempfile
 import io
 import math
 import os
+import time
 from datetime import datetime
-import requests
 import base64
 
-# Import the img_to_array function from Keras
-try:
-    from tensorflow.keras.preprocessing.image import img_to_array # type: ignore
-except ImportError:
-    # Fallback implementation if Keras is not available
-    def img_to_array(img, data_format=None):
-        """Converts a PIL Image instance to a Numpy array."""
-        img_array = np.array(img)
-        if len(img_array.shape) == 2:  # Grayscale image
-            img_array = np.stack((img_array,) * 3, axis=-1)
-        return img_array
-
+# TensorFlow, matplotlib and requests are imported where they are first used so
+# the window appears without waiting for them; TensorFlow is warmed up in the
+# background once the home page is shown.
 from classifier import SatelliteImageClassifier, AuthenticationError, RegistrationError, ModelLoadError, ImageProcessingError
+from classifier import MODEL_SUFFIXES, InferenceWorkerPool, ResultCache, model_registry, warm_up
+from classifier import PRIORITY_INTERACTIVE, JobCancelled, JobScheduler, check_cancelled
+from classifier import metrics
+
+# Cell sizes the main window can switch between without re-running inference
+GRANULARITY_LEVELS = (16, 32, 64)
+
+# Worker processes that host the model so inference never runs under the Tk
+# process's GIL; 0 classifies in the UI process
+INFERENCE_WORKERS = 1
+
+# Classification jobs the app runs at once; further jobs wait in priority order
+JOB_WORKERS = 2
+
+# Cell rows classified between repaints of the classified canvas
+STREAM_BAND_ROWS = 2
+
+# Record tracemalloc peak memory per classification (slows the numpy stages)
+TRACE_MEMORY = False
+
+# Prometheus metrics export: a local port to serve /metrics on and/or a textfile
+# for node_exporter's textfile collector; unset disables each
+METRICS_PORT = int(os.environ.get("SATELLITE_METRICS_PORT", "0")) or None
+METRICS_TEXTFILE = os.environ.get("SATELLITE_METRICS_TEXTFILE") or None
+
+TILE_FETCH_SECONDS = metrics.histogram("satellite_tile_fetch_seconds", "Esri World Imagery tile request latency.")
+TILE_FETCHES = metrics.counter("satellite_tile_fetches_total", "Esri World Imagery tile requests by HTTP status.",
+                               ["status"])
+TILE_FETCH_BYTES = metrics.counter("satellite_tile_fetch_bytes_total", "Bytes downloaded in Esri tiles.")
+
+def fetch_tile(tile_url):
+    """Download one map tile and record its latency, status and size."""
+    import requests
+    start = time.perf_counter()
+    status = "error"
+    try:
+        response = requests.get(tile_url)
+        status = str(response.status_code)
+        TILE_FETCH_BYTES.inc(len(response.content))
+        return response.content
+    finally:
+        TILE_FETCH_SECONDS.observe(time.perf_counter() - start)
+        TILE_FETCHES.labels(status=status).inc()
 
 # Configure customtkinter
 ctk.set_appearance_mode("Dark")
@@ -744,13 +777,22 @@ class ModernScrollableImage(ctk.CTkFrame):
         self.image_obj = self.canvas.create_image(0, 0, anchor="nw", image=self.photo)
         self.canvas.configure(scrollregion=self.canvas.bbox("all"))
 
+    def update_image(self, pil_image):
+        """Repaint the shown image in place, keeping the canvas item and scroll position."""
+        if (self.image_obj is None or self.photo.width() != pil_image.width
+                or self.photo.height() != pil_image.height):
+            self.display_image(pil_image)
+            return
+        self.photo.paste(pil_image)
+
 class QuadrantDisplayWindow(ctk.CTkToplevel):
     """Window to display a quadrant of the satellite image with classification"""
-    def __init__(self, parent, app, quadrant_num, original_img, processed_img, location_info):
+    def __init__(self, parent, app, quadrant_num, original_img, processed_img, location_info, counts=None):
         super().__init__(parent)
         self.app = app
         self.quadrant_num = quadrant_num
         self.location_info = location_info
+        self.counts = counts  # Per-class grid counts from the classification result
         
         self.title(f"🛰️ Quadrant {quadrant_num} Classification")
         self.geometry("1000x700")
@@ -884,33 +926,10 @@ class QuadrantDisplayWindow(ctk.CTkToplevel):
         class_names = self.app.classifier.class_names
         class_colors = self.app.classifier.class_colors
 
-        # Count classes in the processed image
-        try:
-            h, w, _ = self.processed_img.shape
-        except (ValueError, AttributeError) as e:
-            self.status_var.set(f"❌ Invalid image data: {str(e)}")
-            return
-            
-        grid_size = self.app.classifier.grid_size
+        # Counts come straight from the classifier's label grid
         current_counts = {name: 0 for name in class_names}
-
-        for y in range(0, h, grid_size):
-            for x in range(0, w, grid_size):
-                try:
-                    grid_color = self.processed_img[y:y+grid_size, x:x+grid_size].mean(axis=(0, 1))
-                    # Find closest color
-                    min_dist = float('inf')
-                    label = None
-                    for idx, color in class_colors.items():
-                        dist = np.linalg.norm(grid_color - np.array(color))
-                        if dist < min_dist:
-                            min_dist = dist
-                            label = class_names[idx]
-                    if label:
-                        current_counts[label] += 1
-                except Exception as e:
-                    logger.warning(f"Error processing grid at ({x}, {y}): {str(e)}")
-                    continue
+        if self.counts:
+            current_counts.update(self.counts)
 
         # Create modern legend
         legend_title = ctk.CTkLabel(self.legend_frame,
@@ -1041,6 +1060,15 @@ class ModernMainApplication(ctk.CTkFrame):
                                        state="disabled")
         self.process_btn.pack(side="left", padx=5)
 
+        # Cell size toggle; every level comes from the same classification pass
+        self.granularity_btn = ctk.CTkSegmentedButton(button_frame,
+                                                      values=[f"{g} px" for g in GRANULARITY_LEVELS],
+                                                      command=self.app.set_granularity,
+                                                      height=40,
+                                                      state="disabled")
+        self.granularity_btn.set(f"{self.app.classifier.grid_size} px")
+        self.granularity_btn.pack(side="left", padx=5)
+
         # Image display area
         display_frame = ctk.CTkFrame(main_content, fg_color="transparent")
         display_frame.pack(fill="both", expand=True)
@@ -1114,6 +1142,16 @@ class ModernMainApplication(ctk.CTkFrame):
                                         hover_color="#F57C00")
         self.analyse_btn.pack(side="left", padx=5)
 
+        # Timings button
+        ctk.CTkButton(buttons_container,
+                      text="⏱️ Export Timings",
+                      command=self.app.export_timings,
+                      width=200,
+                      height=40,
+                      corner_radius=10,
+                      fg_color="#455A64",
+                      hover_color="#37474F").pack(side="left", padx=5)
+
         # Legend and status area
         bottom_frame = ctk.CTkFrame(main_content, fg_color="transparent")
         bottom_frame.pack(fill="x", pady=(20, 0))
@@ -1130,6 +1168,16 @@ class ModernMainApplication(ctk.CTkFrame):
                                  fg_color=("gray85", "gray25"))
         status_bar.pack(side="bottom", fill="x")
 
+        # Per-stage latency percentiles over recent classifications
+        self.perf_var = ctk.StringVar(value="")
+        perf_bar = ctk.CTkLabel(self,
+                               textvariable=self.perf_var,
+                               font=("Arial", 11),
+                               corner_radius=0,
+                               anchor="e",
+                               fg_color=("gray85", "gray25"))
+        perf_bar.pack(side="bottom", fill="x")
+
 class QuadrantAnalysisWindow(ctk.CTkToplevel):
     """Window to analyze a single quadrant image"""
     def __init__(self, parent, app, quadrant_num):
@@ -1140,6 +1188,7 @@ class QuadrantAnalysisWindow(ctk.CTkToplevel):
         self.original_img = None
         self.classified_img = None
         self.classifier = app.classifier
+        self.job = None  # scheduler handle for this quadrant's classification
         
         self.title(f"🔍 Analyze Quadrant {quadrant_num}")
         self.geometry("1000x700")
@@ -1321,23 +1370,29 @@ class QuadrantAnalysisWindow(ctk.CTkToplevel):
         if not self.image_path:
             return
         
-        # Process image in a thread
-        threading.Thread(target=self._process_thread, daemon=True).start()
+        key = ("quadrant", self.quadrant_num, str(self.image_path))
+        if self.job is not None and not self.job.done():
+            if self.job.key == key:
+                return  # repeated click; keep one handle so Cancel stops the job
+            self.job.cancel()
+        self.job = self.app.jobs.submit(key, self._process_thread, priority=PRIORITY_INTERACTIVE)
 
     def _process_thread(self):
         try:
             self.status_var.set("🔄 Processing image... This may take a moment.")
             
             # Process the image
-            orig, colored = self.classifier.process_image(str(self.image_path))
+            result = self.app.classify(str(self.image_path))
+            check_cancelled()
+            orig, colored = result.image, result.colored_image
             
             # Check if processing returned valid results
             if orig is None or colored is None:
                 raise ImageProcessingError("Image processing returned invalid results")
             
             # Convert to displayable format
-            self.original_img = Image.fromarray((orig * 255).astype(np.uint8))
-            self.classified_img = Image.fromarray((colored * 255).astype(np.uint8))
+            self.original_img = Image.fromarray(orig)
+            self.classified_img = Image.fromarray(colored)
             
             # Display results
             self.display_results()
@@ -1350,6 +1405,8 @@ class QuadrantAnalysisWindow(ctk.CTkToplevel):
             else:
                 self.close_all_btn.configure(state="normal")
             
+        except JobCancelled:
+            pass  # the window is being closed
         except Exception as e:
             messagebox.showerror("Processing Error", str(e))
             self.status_var.set("❌ Image processing failed")
@@ -1458,6 +1515,10 @@ class QuadrantAnalysisWindow(ctk.CTkToplevel):
         self.app.show_main_application()
 
     def cancel_analysis(self):
+        # Stop this quadrant's classification before it spends more CPU
+        if self.job is not None:
+            self.job.cancel()
+
         # Close current window
         self.destroy()
         
@@ -1470,9 +1531,25 @@ class ModernSatelliteApp(ctk.CTk):
     def __init__(self):
         super().__init__()
         self.classifier = SatelliteImageClassifier(authentication_enabled=True)
+        self.classifier.result_cache = ResultCache()  # repeat analyses skip inference
+        self.classifier.trace_memory = TRACE_MEMORY
+        self.classifier.add_profile_hook(self._on_profile)
+        self.metrics_server = None
+        if METRICS_PORT:
+            try:
+                self.metrics_server = metrics.serve(METRICS_PORT)
+            except OSError as e:
+                logger.warning(f"Metrics endpoint unavailable on port {METRICS_PORT}: {str(e)}")
+        if METRICS_TEXTFILE:
+            metrics.write_textfile_every(METRICS_TEXTFILE)
         self.current_image_path = None
         self.original_image = None
         self.colored_image = None
+        self.current_result = None  # Store the latest ClassificationResult
+        self.current_pyramid = None  # ClassificationResults of the latest image keyed by grid size
+        self.inference_pool = None  # worker processes hosting the loaded model
+        self.jobs = JobScheduler(max_workers=JOB_WORKERS)  # interactive jobs run before batch work
+        self.current_job = None  # scheduler handle for the main window's classification
         self.current_counts = None  # Store classification counts for visualization
         self.image_metadata = {}  # Store image metadata
         self.main_app = None  # Store reference to main application
@@ -1491,6 +1568,11 @@ class ModernSatelliteApp(ctk.CTk):
         # Show home page
         self.show_home_page()
 
+        # Import TensorFlow once the UI is up so the first model load is quick; with
+        # inference workers the model, and TensorFlow, live in the workers instead
+        if not INFERENCE_WORKERS:
+            self.after(500, lambda: threading.Thread(target=warm_up, daemon=True).start())
+
     def center_window(self):
         self.update_idletasks()
         width, height = 1400, 900
@@ -1529,7 +1611,7 @@ class ModernSatelliteApp(ctk.CTk):
         # Restore the image data if available
         if self.original_image is not None and self.colored_image is not None:
             # Display original image
-            orig_img = Image.fromarray((self.original_image * 255).astype(np.uint8))
+            orig_img = Image.fromarray(self.original_image)
             display_img = ImageOps.contain(orig_img, (800, 600))
             self.main_app.orig_canvas.display_image(display_img)
             
@@ -1557,10 +1639,29 @@ class ModernSatelliteApp(ctk.CTk):
             self.main_app.status_var.set(msg)
         self.update_idletasks()
 
+    def _on_profile(self, profile):
+        """Profile hook; runs on the classifying thread, so hand the update to Tk."""
+        text = self.classifier.stage_metrics.status_text()
+        if self.main_app is not None and text:
+            self.after(0, lambda: self.main_app.perf_var.set(f"⏱️ {profile.call}: {text}"))
+
+    def export_timings(self):
+        path = filedialog.asksaveasfilename(
+            title="Export Timings",
+            defaultextension=".json",
+            filetypes=[("JSON files", "*.json"), ("All files", "*.*")]
+        )
+        if path:
+            try:
+                self.classifier.stage_metrics.dump(path)
+                self.update_status(f"✅ Timings saved to {Path(path).name}")
+            except OSError as e:
+                messagebox.showerror("Export Error", str(e))
+
     def load_model_dialog(self):
         path = filedialog.askopenfilename(
             title="Select Model File",
-            filetypes=[("Keras/H5 Models", "*.h5 *.keras"), ("All files", "*.*")]
+            filetypes=[("Models", "*.h5 *.keras *.tflite *.onnx"), ("All files", "*.*")]
         )
         if path:
             threading.Thread(target=self._load_model_thread, args=(path,), daemon=True).start()
@@ -1568,15 +1669,56 @@ class ModernSatelliteApp(ctk.CTk):
     def _load_model_thread(self, path):
         try:
             self.update_status("🔄 Loading model...")
-            self.classifier.load_model(path)
+            reused = self.inference_pool is not None and self.inference_pool.serves(self.classifier, path)
+            if not self._start_inference_pool(path):
+                reused = model_registry.contains(Path(path), MODEL_SUFFIXES.get(Path(path).suffix.lower(), ""))
+                self.classifier.load_model(path)
             model_name = Path(path).name
             self.main_app.model_var.set(f"✅ Model: {model_name}")
             self.main_app.load_image_btn.configure(state="normal")
-            self.update_status(f"✅ Model '{model_name}' loaded successfully")
+            if reused:
+                self.update_status(f"✅ Model '{model_name}' reused from memory")
+            else:
+                self.update_status(f"✅ Model '{model_name}' loaded successfully")
         except Exception as e:
             messagebox.showerror("Model Load Error", str(e))
             self.update_status("❌ Model loading failed")
 
+    def _start_inference_pool(self, path):
+        """Have worker processes load the model at path; False when the UI process must load it.
+
+        The workers own the only copy of the model, so the UI process neither
+        imports TensorFlow nor holds the weights. Workers that already host the
+        same model (by content) keep running, so picking the file again does not
+        pay for new processes and a model reload.
+        """
+        if self.inference_pool is not None and self.inference_pool.serves(self.classifier, path):
+            return True
+        old_pool, self.inference_pool = self.inference_pool, None
+        if old_pool is not None:
+            old_pool.close()
+        if not INFERENCE_WORKERS:
+            return False
+        try:
+            self.inference_pool = InferenceWorkerPool(self.classifier, processes=INFERENCE_WORKERS, model_path=path)
+        except Exception as e:
+            logger.warning(f"Inference workers unavailable, classifying in-process: {str(e)}")
+            return False
+        self.classifier.release_model()  # drop a copy left from an earlier in-process load
+        return True
+
+    def classify(self, image_path):
+        """ClassificationResult for one image, from the worker pool when it is running."""
+        if self.inference_pool is not None:
+            return self.inference_pool.classify_image(image_path)
+        return self.classifier.classify_image(image_path)
+
+    def classify_stream(self, image_path, grid_sizes):
+        """classify_stream steps over all grid_sizes, from the worker pool when it is running."""
+        if self.inference_pool is not None:
+            return self.inference_pool.classify_stream(image_path, STREAM_BAND_ROWS, grid_sizes)
+        return self.classifier.classify_stream(image_path, STREAM_BAND_ROWS, grid_sizes)
+
     def load_image_dialog(self):
         path = filedialog.askopenfilename(
             title="Select Satellite Image",
@@ -1586,8 +1728,13 @@ class ModernSatelliteApp(ctk.CTk):
             ]
         )
         if path:
+            if self.current_job is not None:
+                self.current_job.cancel()  # results for the previous image are no longer wanted
+                self.current_job = None
             self.current_image_path = Path(path)
+            self.current_pyramid = None
             self.main_app.process_btn.configure(state="normal")
+            self.main_app.granularity_btn.configure(state="disabled")
             
             # Load and display image
             pil_img = Image.open(path)
@@ -1640,33 +1787,65 @@ class ModernSatelliteApp(ctk.CTk):
     def process_image(self):
         if not self.current_image_path:
             return
-        threading.Thread(target=self._process_thread, daemon=True).start()
+        if self.current_job is not None and not self.current_job.done():
+            return  # repeated click; loading another image cancels the running job
+        self.current_job = self.jobs.submit(("main", str(self.current_image_path)),
+                                            self._process_thread, priority=PRIORITY_INTERACTIVE)
 
     def _process_thread(self):
         try:
             self.update_status("🔄 Processing image... This may take a moment.")
-            orig, colored = self.classifier.process_image(str(self.current_image_path))
+            path = str(self.current_image_path)
+            grid_size = self.classifier.grid_size
+            self.main_app.granularity_btn.configure(state="disabled")
+
+            # Stream the current cell size so the map fills in band by band; the other
+            # sizes share the same decode and inference pass
+            levels = [grid_size] + [g for g in GRANULARITY_LEVELS if g != grid_size]
+            for progress in self.classify_stream(path, levels):
+                img = Image.fromarray(progress.result.colored_image)
+                self.main_app.proc_canvas.update_image(ImageOps.contain(img, (800, 600)))
+                self.update_status(f"🔄 Classified {progress.rows_done}/{progress.rows_total} rows of cells...")
+            result = progress.result
             
             # Check if processing returned valid results
-            if orig is None or colored is None:
+            if result.image is None or result.colored_image is None:
                 raise ImageProcessingError("Image processing returned invalid results")
-                
-            self.original_image = orig
-            self.colored_image = (colored * 255).astype(np.uint8)
-
-            # Display processed image
-            img = Image.fromarray(self.colored_image)
-            display_img = ImageOps.contain(img, (800, 600))
-            self.main_app.proc_canvas.display_image(display_img)
 
-            # Show legend and analysis
-            self.show_legend_and_analysis()
+            self.current_pyramid = progress.levels
+            self.show_result(result)
+            self.main_app.granularity_btn.configure(state="normal")
+            self.main_app.granularity_btn.set(f"{grid_size} px")
             self.update_status("✅ Image processed successfully! Check the classified results.")
             
+        except JobCancelled:
+            self.update_status("⏹️ Processing cancelled")
         except Exception as e:
             messagebox.showerror("Processing Error", str(e))
             self.update_status("❌ Image processing failed")
 
+    def show_result(self, result):
+        self.current_result = result
+        self.original_image = result.image
+        self.colored_image = result.colored_image
+
+        # Display processed image
+        img = Image.fromarray(self.colored_image)
+        display_img = ImageOps.contain(img, (800, 600))
+        self.main_app.proc_canvas.display_image(display_img)
+
+        # Show legend and analysis
+        self.show_legend_and_analysis()
+
+    def set_granularity(self, value):
+        """Switch the displayed cell size using the already computed pyramid."""
+        if not self.current_pyramid:
+            return
+        grid_size = int(value.split()[0])
+        if grid_size in self.current_pyramid:
+            self.show_result(self.current_pyramid[grid_size])
+            self.update_status(f"✅ Showing {grid_size} px cells")
+
     def show_legend_and_analysis(self):
         # Clear previous legend
         for widget in self.main_app.legend_frame.winfo_children():
@@ -1684,33 +1863,12 @@ class ModernSatelliteApp(ctk.CTk):
         class_names = self.classifier.class_names
         class_colors = self.classifier.class_colors
 
-        # Count classes in the processed image
-        try:
-            h, w, _ = self.colored_image.shape
-        except (ValueError, AttributeError) as e:
-            self.update_status(f"❌ Invalid image data: {str(e)}")
+        if self.current_result is None:
+            self.update_status("❌ No classification result available")
             return
-            
-        grid_size = self.classifier.grid_size
-        self.current_counts = {name: 0 for name in class_names}  # Store counts for visualization
 
-        for y in range(0, h, grid_size):
-            for x in range(0, w, grid_size):
-                try:
-                    grid_color = self.colored_image[y:y+grid_size, x:x+grid_size].mean(axis=(0, 1))
-                    # Find closest color
-                    min_dist = float('inf')
-                    label = None
-                    for idx, color in class_colors.items():
-                        dist = np.linalg.norm(grid_color - np.array(color))
-                        if dist < min_dist:
-                            min_dist = dist
-                            label = class_names[idx]
-                    if label:
-                        self.current_counts[label] += 1
-                except Exception as e:
-                    logger.warning(f"Error processing grid at ({x}, {y}): {str(e)}")
-                    continue
+        # Store counts for visualization
+        self.current_counts = self.current_result.named_counts(class_names)
 
         # Create modern legend
         legend_title = ctk.CTkLabel(self.main_app.legend_frame,
@@ -1756,6 +1914,7 @@ class ModernSatelliteApp(ctk.CTk):
 
     def plot_analysis_chart(self, counts):
         """Create and display the land cover classification distribution chart"""
+        import matplotlib.pyplot as plt
         plt.figure(figsize=(14, 8))
         
         classes = list(counts.keys())
@@ -1811,6 +1970,7 @@ class ModernSatelliteApp(ctk.CTk):
 
     def plot_classification_pie_chart(self, counts):
         """Create and display the classification pie chart"""
+        import matplotlib.pyplot as plt
         plt.figure(figsize=(12, 10))
         
         classes = list(counts.keys())
@@ -2292,8 +2452,7 @@ class ModernSatelliteApp(ctk.CTk):
                     tile_url = f"https://server.arcgisonline.com/ArcGIS/rest/services/World_Imagery/MapServer/tile/{zoom_val}/{ytile}/{xtile}"
                     
                     # Fetch the tile
-                    response = requests.get(tile_url)
-                    img_data = response.content
+                    img_data = fetch_tile(tile_url)
                     
                     # Open the tile image
                     tile_img = Image.open(io.BytesIO(img_data))
@@ -2491,8 +2650,7 @@ class ModernSatelliteApp(ctk.CTk):
                         tile_url = f"https://server.arcgisonline.com/ArcGIS/rest/services/World_Imagery/MapServer/tile/{zoom_val}/{tile_y}/{tile_x}"
                         
                         # Fetch the tile
-                        response = requests.get(tile_url)
-                        img_data = response.content
+                        img_data = fetch_tile(tile_url)
                         
                         # Open the tile image
                         tile_img = Image.open(io.BytesIO(img_data))
@@ -2779,10 +2937,11 @@ class ModernSatelliteApp(ctk.CTk):
                     quadrant.save(temp_file)
                     
                     # Process the quadrant using the classifier
-                    orig, colored = self.classifier.process_image(temp_file)
+                    result = self.classify(temp_file)
                     
-                    # Convert to colored image
-                    colored_quadrant = (colored * 255).astype(np.uint8)
+                    # The classifier already renders a uint8 colour map
+                    colored_quadrant = result.colored_image
+                    quadrant_counts = result.named_counts(self.classifier.class_names)
                     
                     # Create a frame for this quadrant
                     row = i // 2
@@ -2850,7 +3009,7 @@ class ModernSatelliteApp(ctk.CTk):
                     view_btn = ctk.CTkButton(
                         quadrant_frame,
                         text="🔍 View Full Size",
-                        command=lambda idx=i, quad=quadrant, col_quad=colored_quadrant: self.view_quadrant_full_size(idx+1, quad, col_quad, location_info),
+                        command=lambda idx=i, quad=quadrant, col_quad=colored_quadrant, counts=quadrant_counts: self.view_quadrant_full_size(idx+1, quad, col_quad, location_info, counts),
                         width=150,
                         height=30,
                         corner_radius=10
@@ -2882,9 +3041,9 @@ class ModernSatelliteApp(ctk.CTk):
         except Exception as e:
             messagebox.showerror("Processing Error", f"Failed to process the satellite image: {str(e)}")
 
-    def view_quadrant_full_size(self, quadrant_num, original_img, processed_img, location_info):
+    def view_quadrant_full_size(self, quadrant_num, original_img, processed_img, location_info, counts=None):
         """View a single quadrant in full size"""
-        quadrant_window = QuadrantDisplayWindow(self, self, quadrant_num, original_img, Image.fromarray(processed_img), location_info)
+        quadrant_window = QuadrantDisplayWindow(self, self, quadrant_num, original_img, Image.fromarray(processed_img), location_info, counts)
         self.quadrant_windows.append(quadrant_window)
 
     def close_all_quadrant_windows(self):
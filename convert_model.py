@@ -0,0 +1,161 @@
+"""Export the Keras classifier to TFLite and ONNX and check the exports agree with it.
+
+    python convert_model.py export satelliteImageClassifierWeights.h5 --tflite model.tflite --onnx model.onnx --images samples/
+    python convert_model.py quantize satelliteImageClassifierWeights.h5 samples/ --output model_int8.tflite
+"""
+import argparse
+import logging
+import tempfile
+import time
+from pathlib import Path
+from typing import List
+
+import numpy as np
+
+from classifier import (
+    BACKENDS,
+    SatelliteImageClassifier,
+    backend_parity,
+    export_onnx,
+    export_tflite,
+)
+
+logger = logging.getLogger(__name__)
+
+def reference_tiles(classifier: SatelliteImageClassifier, image_paths: List[Path], count: int = 512) -> np.ndarray:
+    """Model-ready tiles cut from the given images the same way classify_image cuts them.
+
+    Without images a fixed-seed random batch is used, which exercises the exported
+    graph but says less about agreement on real imagery.
+    """
+    batches = []
+    for path in image_paths:
+        image = classifier.load_image(str(path))
+        tiles = classifier.tile_image(image, classifier.grid_size)
+        batches.append(classifier.resize_tiles(tiles).copy())
+        if sum(len(b) for b in batches) >= count:
+            break
+    if not batches:
+        w, h = classifier.model_input_size
+        return np.random.default_rng(0).integers(0, 256, (count, h, w, 3), dtype=np.uint8)
+    return np.concatenate(batches)[:count]
+
+def sample_tiles(classifier: SatelliteImageClassifier, image_paths: List[Path], count: int,
+                 seed: int = 0) -> np.ndarray:
+    """Up to `count` model-ready tiles drawn at random from all grid cells of the images.
+
+    Cells come from divide_image_into_grids, so calibration sees exactly the tiles
+    classify_image would feed the model.
+    """
+    rng = np.random.default_rng(seed)
+    pool = np.concatenate([
+        classifier.divide_image_into_grids(classifier.load_image(str(path)), classifier.grid_size)
+        for path in image_paths
+    ])
+    picked = pool[rng.permutation(len(pool))[:count]]
+    # A (k, 1, g, g, C) view resizes each tile on its own strip
+    return classifier.resize_tiles(picked[:, np.newaxis]).copy()
+
+def tiles_per_second(backend, tiles: np.ndarray, repeats: int = 3) -> float:
+    backend.predict(tiles[:1])
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        backend.predict(tiles)
+        best = min(best, time.perf_counter() - start)
+    return len(tiles) / best
+
+def image_files(source: str | None, extensions) -> List[Path]:
+    if not source:
+        return []
+    path = Path(source)
+    if path.is_dir():
+        return sorted(p for p in path.iterdir() if p.suffix.lower() in extensions)
+    return [path]
+
+def export(args) -> int:
+    classifier = SatelliteImageClassifier(authentication_enabled=False)
+    classifier.load_model(args.model, backend="keras")
+    tiles = reference_tiles(classifier, image_files(args.images, classifier.supported_extensions), args.tiles)
+
+    failed = False
+    targets = [("tflite", args.tflite, export_tflite), ("onnx", args.onnx, export_onnx)]
+    for name, output, exporter in targets:
+        if not output:
+            continue
+        # Export with the /255 rescaling fused in, so the exported model takes uint8 tiles
+        path = exporter(classifier.backend.fused_model, output)
+        candidate = BACKENDS[name](path)
+        agreement = backend_parity(classifier.backend, candidate, tiles)
+        logger.info(f"{name}: wrote {path}, label agreement {agreement:.4f} on {len(tiles)} tiles")
+        if agreement < args.min_agreement:
+            logger.error(f"{name} export disagrees with the Keras model (required {args.min_agreement})")
+            failed = True
+    return 1 if failed else 0
+
+def quantize(args) -> int:
+    classifier = SatelliteImageClassifier(authentication_enabled=False)
+    classifier.load_model(args.model, backend="keras")
+    images = image_files(args.images, classifier.supported_extensions)
+    if not images:
+        logger.error(f"No images found in {args.images}")
+        return 1
+    tiles = sample_tiles(classifier, images, args.calibration_tiles + args.eval_tiles, args.seed)
+    calibration, evaluation = tiles[:args.calibration_tiles], tiles[args.calibration_tiles:]
+    if not len(evaluation):
+        logger.error("Not enough tiles left over for evaluation, add images or lower --calibration-tiles")
+        return 1
+    logger.info(f"Calibrating on {len(calibration)} tiles, evaluating on {len(evaluation)}")
+
+    int8_path = export_tflite(classifier.backend.fused_model, args.output, calibration_tiles=calibration)
+    with tempfile.TemporaryDirectory() as tmp:
+        float_path = export_tflite(classifier.backend.fused_model, Path(tmp) / "float.tflite")
+        float_backend = BACKENDS["tflite"](float_path)
+        int8_backend = BACKENDS["tflite"](int8_path)
+        float_size = float_path.stat().st_size
+
+        agreement = backend_parity(classifier.backend, int8_backend, evaluation)
+        float_rate = tiles_per_second(float_backend, evaluation)
+        int8_rate = tiles_per_second(int8_backend, evaluation)
+    int8_size = int8_path.stat().st_size
+
+    logger.info(f"Label agreement with the float model: {agreement:.4f}")
+    logger.info(f"Throughput: float {float_rate:.0f} tiles/s, int8 {int8_rate:.0f} tiles/s "
+                f"({int8_rate / float_rate:.2f}x)")
+    logger.info(f"Model size: float {float_size / 1e6:.2f} MB, int8 {int8_size / 1e6:.2f} MB "
+                f"({float_size / int8_size:.2f}x smaller)")
+    if agreement < args.min_agreement:
+        logger.error(f"INT8 model disagrees with the float model (required {args.min_agreement})")
+        return 1
+    return 0
+
+def main(argv=None) -> int:
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    exp = commands.add_parser("export", help="Export a Keras model to TFLite and/or ONNX")
+    exp.add_argument("model", help="Keras .h5/.keras model")
+    exp.add_argument("--tflite", help="Output .tflite path")
+    exp.add_argument("--onnx", help="Output .onnx path (needs tf2onnx and onnxruntime)")
+    exp.add_argument("--images", help="Image file or directory to cut reference tiles from")
+    exp.add_argument("--tiles", type=int, default=512, help="Number of reference tiles")
+    exp.add_argument("--min-agreement", type=float, default=1.0,
+                     help="Minimum label agreement; exports must match exactly unless lowered")
+    exp.set_defaults(func=export)
+
+    quant = commands.add_parser("quantize", help="INT8 post-training quantization to TFLite")
+    quant.add_argument("model", help="Keras .h5/.keras model")
+    quant.add_argument("images", help="Directory of imagery to draw calibration tiles from")
+    quant.add_argument("--output", default="model_int8.tflite", help="Output .tflite path")
+    quant.add_argument("--calibration-tiles", type=int, default=500, help="Tiles used for calibration")
+    quant.add_argument("--eval-tiles", type=int, default=1000, help="Held-out tiles used for the report")
+    quant.add_argument("--seed", type=int, default=0, help="Tile sampling seed")
+    quant.add_argument("--min-agreement", type=float, default=0.98, help="Minimum label agreement")
+    quant.set_defaults(func=quantize)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+if __name__ == "__main__":
+    raise SystemExit(main())